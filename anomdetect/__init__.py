@@ -1,4 +1,16 @@
-from adtk_bounds import ADTK_Bounds
-from anomaly import Anomaly
-from spc import SPC
-from utils_ad import logic_to_numeric, num_den_to_ratio
\ No newline at end of file
+
+from .adtk_bounds import ADTK_Bounds
+from .anomaly import Anomaly
+from .spc import SPC, LimitTable
+from .rolling import RollingQuantile, RollingPChart
+from .sketch import KLLSketch, StreamingQuantileAD
+from .ingest import read_chunks, read_validated, from_arrow, from_arrays
+from .seasonal import IncrementalSeasonalAD
+from .pca import IncrementalPcaAD
+from .regression import SufficientStatsRegressionAD
+from .storage import SparseBounds
+from .replay import walk_forward, walk_forward_many
+from .cache import BoundsCache
+from .plot import downsample, plot_bounds
+from . import instrument
+from .utils_ad import logic_to_numeric, num_den_to_ratio
\ No newline at end of file
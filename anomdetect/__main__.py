@@ -0,0 +1,183 @@
+"""Batch scoring from the command line.
+
+Every metric file in a directory, or listed in a manifest, is read, fit with a detector recipe, assembled and written to ``<out>/<metric>.parquet``. Finished metrics are appended to a checkpoint file as soon as their output is written, so a rerun with the same checkpoint skips them and an interrupted run picks up where it stopped.
+
+Typical use::
+
+    python -m anomdetect data/ --recipe recipe.json --out scores/ --var-type ratio --numerator Numerator --denominator Denominator --workers 8
+
+where recipe.json holds either a list of [method, keyword arguments] pairs, weighted equally, or an object with "methods" and "weights"::
+
+    {"methods": [["spc", {"chart": "p"}], ["ad_quantile", {"high": 0.99}]], "weights": [0.5, 0.5]}
+
+A manifest is a .json list of objects, or a .csv with one row per metric, with the fields metric and path. Any of date_col, var_type, numerator, denominator and value given there overrides the command-line defaults for that metric.
+"""
+
+import argparse
+import json
+import os
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from .anomaly import Anomaly
+from .ingest import read_validated
+
+_EXTENSIONS = ('.csv', '.parquet', '.pq')
+_FIELDS = ('date_col', 'var_type', 'numerator', 'denominator', 'value')
+
+
+def _load_recipe(recipe, weights=None):
+    if os.path.exists(recipe):
+        with open(recipe) as f:
+            recipe = json.load(f)
+    else:
+        recipe = json.loads(recipe)
+    if isinstance(recipe, dict):
+        weights = recipe.get('weights', weights) if weights is None else weights
+        recipe = recipe['methods']
+    return [(name, dict(kwargs)) for name, kwargs in recipe], weights
+
+def _load_jobs(source, defaults):
+    if os.path.isdir(source):
+        entries = [{'metric': os.path.splitext(f)[0], 'path': os.path.join(source, f)}
+                   for f in sorted(os.listdir(source)) if os.path.splitext(f)[1].lower() in _EXTENSIONS]
+    elif source.lower().endswith('.json'):
+        with open(source) as f:
+            entries = json.load(f)
+    else:
+        entries = pd.read_csv(source, dtype=str).to_dict('records')
+    base = os.path.dirname(os.path.abspath(source)) if not os.path.isdir(source) else None
+    jobs = []
+    for entry in entries:
+        job = dict(defaults)
+        job.update({k: v for k, v in entry.items() if k in _FIELDS and not pd.isna(v)})
+        job['metric'] = str(entry['metric'])
+        job['path'] = entry['path'] if base is None else os.path.join(base, entry['path']) #Manifest paths are relative to the manifest
+        jobs.append(job)
+    return jobs
+
+def _read_checkpoint(path):
+    if path is None or not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return set(line.rstrip('\n') for line in f if line.strip())
+
+def _mark_done(path, metric):
+    with open(path, 'a') as f:
+        f.write(metric + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+def score(job, recipe, weights, out, date_format=None):
+    """Scores one metric file and writes its assembled bounds.
+
+    :param dict job: Required. metric, path, date_col, var_type and numerator and denominator (ratio) or value (univariate).
+
+    :param list recipe: Required. List of (method name, dict of keyword arguments) pairs, as for Anomaly.fit_all().
+
+    :param list weights: Passed to Anomaly.assemble(). None weights the methods equally.
+
+    :param str out: Required. Output directory.
+
+    :param str date_format: Default None. strftime format of the date column.
+
+    :returns: tuple of (metric, output path).
+    """
+    if job['var_type'] == 'ratio':
+        columns = [job['numerator'], job['denominator']]
+    else:
+        columns = [job['value']]
+    df = read_validated(job['path'], job['date_col'], columns, date_format=date_format)
+    anomaly = Anomaly(df, var_type=job['var_type'], numerator=job.get('numerator'), denominator=job.get('denominator'))
+    anomaly.validate(job['date_col'])
+    anomaly.fit_all(recipe)
+    result = anomaly.assemble(weights)
+    if isinstance(result, str):
+        raise ValueError(result)
+    path = os.path.join(out, job['metric'] + '.parquet')
+    tmp = path + '.tmp'
+    result.to_parquet(tmp)
+    os.replace(tmp, path) #A run killed mid-write leaves no partial output behind
+    return job['metric'], path
+
+def _score_task(args):
+    job = args[0]
+    try:
+        return job['metric'], score(*args)[1], None
+    except Exception:
+        return job['metric'], None, traceback.format_exc()
+
+def run(jobs, recipe, weights, out, workers=1, checkpoint=None, date_format=None):
+    """Scores metrics in parallel, skipping and recording finished ones in the checkpoint file.
+
+    :param list jobs: Required. Metric descriptions, see score().
+
+    :param list recipe: Required. Passed to score().
+
+    :param list weights: Passed to score(). May be None.
+
+    :param str out: Required. Output directory.
+
+    :param int workers: Default 1. Number of worker processes. Metrics are scored in the calling process if 1.
+
+    :param str checkpoint: Default None. Path of the checkpoint file. ``<out>/_checkpoint`` if None.
+
+    :param str date_format: Default None. strftime format of the date columns.
+
+    :returns: dict of metric name to traceback for the metrics that failed.
+    """
+    os.makedirs(out, exist_ok=True)
+    checkpoint = os.path.join(out, '_checkpoint') if checkpoint is None else checkpoint
+    done = _read_checkpoint(checkpoint)
+    todo = [job for job in jobs if job['metric'] not in done]
+    print("%d metrics, %d already done" % (len(jobs), len(jobs) - len(todo)), file=sys.stderr)
+    tasks = [(job, recipe, weights, out, date_format) for job in todo]
+    failed = {}
+    def finish(metric, path, error):
+        if error is None:
+            _mark_done(checkpoint, metric)
+            print("done %s -> %s" % (metric, path), file=sys.stderr)
+        else:
+            failed[metric] = error
+            print("failed %s\n%s" % (metric, error), file=sys.stderr)
+    if workers <= 1:
+        for task in tasks:
+            finish(*_score_task(task))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for future in as_completed([pool.submit(_score_task, task) for task in tasks]):
+                finish(*future.result())
+    return failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m anomdetect', description='Batch anomaly scoring of metric files.')
+    parser.add_argument('source', help='Directory of .csv/.parquet metric files, or a .json/.csv manifest.')
+    parser.add_argument('--recipe', required=True, help='JSON file or string: list of [method, kwargs] pairs, or {"methods": [...], "weights": [...]}.')
+    parser.add_argument('--out', required=True, help='Output directory for <metric>.parquet files.')
+    parser.add_argument('--weights', type=float, nargs='+', default=None, help='Weights passed to Anomaly.assemble(). Overrides the recipe file.')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes.')
+    parser.add_argument('--checkpoint', default=None, help='Checkpoint file. Default <out>/_checkpoint.')
+    parser.add_argument('--date-col', default='Date')
+    parser.add_argument('--date-format', default=None)
+    parser.add_argument('--var-type', default='univariate', choices=['univariate', 'ratio'])
+    parser.add_argument('--numerator', default=None)
+    parser.add_argument('--denominator', default=None)
+    parser.add_argument('--value', default=None, help='Value column of univariate metrics.')
+    args = parser.parse_args(argv)
+    try:
+        import pyarrow #DataFrame.to_parquet needs it for the output files
+    except ImportError:
+        parser.error("pyarrow is required to write the .parquet outputs: pip install anomdetect[parquet]")
+    recipe, weights = _load_recipe(args.recipe, args.weights)
+    defaults = {'date_col': args.date_col, 'var_type': args.var_type, 'numerator': args.numerator,
+                'denominator': args.denominator, 'value': args.value}
+    jobs = _load_jobs(args.source, defaults)
+    failed = run(jobs, recipe, weights, args.out, args.workers, args.checkpoint, args.date_format)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
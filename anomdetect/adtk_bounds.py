@@ -1,13 +1,19 @@
 
 import copy
-import utils_ad
+from . import utils_ad
+from . import instrument
 import math
+import numpy as np
 import pandas as pd
+import adtk.detector as ad
 
 import sys
 sys.setrecursionlimit(10000)
 
 
+_INVARIANT = (ad.QuantileAD, ad.ThresholdAD, ad.InterQuartileRangeAD) #Thresholds fixed at fit time, the same at every timestamp
+
+
 class ADTK_Bounds:
     
     """This class creates the mathematical bounds that the ADTK package uses in order to determine if a point is an anomaly or not.
@@ -17,108 +23,240 @@ class ADTK_Bounds:
         self._s = s
         self._adtk_obj = adtk_obj
         
-    def univ_bounds(self,delta=.0001):
-        """Calculate the univariate bounds for ADTK algorithms. 
+    def regime(self):
+        """Classifies how the detector's thresholds vary over time, which decides how many searches univ_bounds needs.
+        
+        :returns: str.
+        - "invariant" if the thresholds are the same at every timestamp (QuantileAD, ThresholdAD, InterQuartileRangeAD); one search covers all points;
+        - "seasonal" if they repeat with the seasonal period (SeasonalAD without trend); one search per phase;
+        - "point" otherwise; every point is searched.
+        """
+        if isinstance(self._adtk_obj, _INVARIANT):
+            return "invariant"
+        if isinstance(self._adtk_obj, ad.SeasonalAD) and not self._adtk_obj.trend and getattr(self._adtk_obj, 'freq_', None):
+            return "seasonal"
+        return "point"
+    
+    def _regime_keys(self):
+        regime = self.regime()
+        if regime == "invariant":
+            return np.zeros(len(self._s), dtype=int)
+        elif regime == "seasonal":
+            return np.arange(len(self._s)) % self._adtk_obj.freq_
+        return None
+    
+    def _flagged(self, temp_s, index, x, col='temp_s', adtk_obj=None):
+        adtk_obj = self._adtk_obj if adtk_obj is None else adtk_obj
+        temp_s.at[index,col] = x
+        anoms = utils_ad.logic_to_numeric(adtk_obj.predict(temp_s))
+        instrument.count('predict')
+        instrument.count('bound_iterations')
+        flag = anoms.iat[anoms.index.get_loc(index), 0]
+        return flag != 0 #NaN counts as anomalous, as in the stepping search
+    
+    def _crossing(self, index, delta, sign):
+        #Value just outside the normal range in direction sign, found by galloping out from the point and then bisecting
+        temp_s = pd.DataFrame({'temp_s':self._s.copy()})
+        x0 = temp_s.at[index,'temp_s']
+        inside = x0
+        step = delta
+        while not self._flagged(temp_s, index, x0 + sign*step):
+            inside = x0 + sign*step
+            step *= 2
+            if math.isinf(x0 + sign*step):
+                return sign*math.inf
+        outside = x0 + sign*step
+        while abs(outside - inside) > delta*1e-6:
+            mid = (inside + outside)/2
+            if mid == inside or mid == outside:
+                break
+            if self._flagged(temp_s, index, mid):
+                outside = mid
+            else:
+                inside = mid
+        return outside
+    
+    def _first_flag(self, adtk_obj, temp_s, index, col, x0, sign, delta, seed=None):
+        #Smallest k >= 1 for which the point is flagged at x0 + sign*k*delta, i.e. where a walk from x0 in steps of delta stops.
+        #Checks the first step, then starts at the seed (a neighbour's bound), gallops until the crossing is bracketed and bisects, so a good seed needs three predicts.
+        #Assumes the walk crosses into the anomalous range once. Returns None if no crossing is found.
+        flagged = lambda k: self._flagged(temp_s, index, x0 + sign*k*delta, col, adtk_obj)
+        if flagged(1):
+            return 1 #The first step is already anomalous, as for a point that stays flagged after the refit
+        k = 1
+        if seed is not None and math.isfinite(seed) and math.isfinite(x0):
+            k = max(int(math.floor((seed - x0)*sign/delta)) + 1, 1)
+        if k > 1 and flagged(k):
+            hi = k
+            step = 1
+            while hi > 1:
+                lo = max(hi - step, 1)
+                if not flagged(lo):
+                    break
+                hi = lo
+                step *= 2
+            else:
+                return 1
+        else:
+            lo = k
+            step = 1
+            while True:
+                hi = lo + step
+                if hi > 2**62:
+                    return None
+                if flagged(hi):
+                    break
+                lo = hi
+                step *= 2
+        while hi - lo > 1:
+            mid = (lo + hi)//2
+            if flagged(mid):
+                hi = mid
+            else:
+                lo = mid
+        return hi
+
+    def _walk_end(self, x0, k, sign, delta):
+        if k is None:
+            return sign*math.inf
+        return x0 + sign*(k-1)*delta
+
+    def _aligned(self, x, crossings, delta):
+        #Last value on the point's own delta grid before each crossing, i.e. what stepping from x would stop at
+        up, down = crossings
+        upper = x + (math.ceil((up - x)/delta) - 1)*delta if not math.isinf(up) else up
+        lower = x - (math.ceil((x - down)/delta) - 1)*delta if not math.isinf(down) else down
+        return upper, lower
+        
+    @instrument.timed('ADTK_Bounds.univ_bounds')
+    def univ_bounds(self,delta=.0001, index=None, search_flagged=True, refit=True):
+        """Calculate the univariate bounds for ADTK algorithms. For detectors whose regime() is "invariant" or "seasonal", unflagged points are not stepped one by one: the threshold crossing is searched once per regime and each point's bounds are read off its own delta grid. Flagged points, and every point of a "point" detector, are still refit and searched individually, seeded from the bounds of the previous point searched.
         
         :param float delta: Required; default .0001. Offset to bounds.
         
+        :param index: Default None. If given, only these timestamps and the points the detector flags are searched; every other row gets NaN bounds.
+        
+        :param bool search_flagged: Default True. With index given, also search the flagged points outside it. Set False to search index only.
+        
+        :param bool refit: Default True. Refit the detector for each flagged point with the point replaced by the median. Set False to search flagged points against the detector as fitted, which keeps the cost independent of the length of the series.
+        
         :returns: Pandas DataFrame with univariate bound violations.
         """
         
         main = self._adtk_obj.predict(self._s)
+        instrument.count('predict')
         main = utils_ad.logic_to_numeric(main)
         main.columns = ['anomaly_logic']
         upper = [0]*len(self._s)
         lower = [0]*len(self._s)
+        search = None if index is None else set(index)
+        keys = self._regime_keys()
+        crossings = {}
+        seed_up, seed_down = None, None
         i = 0
         for index in self._s.index:
-            adtk_obj = copy.deepcopy(self._adtk_obj)
-            up_temp_s = self._s.copy()
-            up_temp_s = pd.DataFrame({'temp_s':up_temp_s})
-            up_temp_s.set_index(self._s.index)
-            up = 0
-            down_temp_s = self._s.copy()
-            down_temp_s = pd.DataFrame({'temp_s':down_temp_s})
-            down_temp_s.set_index(self._s.index)
-            down = 0
-            if main.at[index,'anomaly_logic'] == 0:
-                pass
+            if search is not None and index not in search and (main.at[index,'anomaly_logic'] != 1 or not search_flagged):
+                upper[i] = float('nan')
+                lower[i] = float('nan')
+                i+=1
+                continue
+            if keys is not None and main.at[index,'anomaly_logic'] == 0:
+                #Unflagged points share the thresholds of their regime, so search once per regime and broadcast
+                if keys[i] not in crossings:
+                    crossings[keys[i]] = (self._crossing(index, delta, 1), self._crossing(index, delta, -1))
+                upper[i], lower[i] = self._aligned(self._s.at[index], crossings[keys[i]], delta)
+                i+=1
+                continue
+            if refit:
+                adtk_obj = copy.deepcopy(self._adtk_obj)
+                instrument.count('deepcopy')
             else:
-                up_temp_s.at[index,'temp_s'] = up_temp_s.median()
-                down_temp_s.at[index,'temp_s'] = down_temp_s.median()
-                adtk_obj.fit_detect(up_temp_s)
-            while up == 0:
-                up_temp_s.at[index,'temp_s'] = up_temp_s.at[index,'temp_s'] + delta
-                up_anoms = adtk_obj.predict(up_temp_s)
-                up_anoms = utils_ad.logic_to_numeric(up_anoms)
-                up_anoms.columns = ['anomaly_logic']
-                up = up_anoms.at[index,'anomaly_logic']
-                if math.isnan(up):
-                    up = 1
-            while down ==0:
-                down_temp_s.at[index,'temp_s'] = down_temp_s.at[index,'temp_s'] - delta
-                down_anoms = adtk_obj.predict(down_temp_s)
-                down_anoms = utils_ad.logic_to_numeric(down_anoms)
-                down_anoms.columns = ['anomaly_logic']
-                down = down_anoms.at[index,'anomaly_logic']
-                if math.isnan(down):
-                    down = 1
-            upper[i] = up_temp_s.at[index,'temp_s']-delta
-            lower[i] = down_temp_s.at[index,'temp_s']+delta
+                adtk_obj = self._adtk_obj
+            temp_s = pd.DataFrame({'temp_s':self._s.copy()})
+            if main.at[index,'anomaly_logic'] != 0:
+                temp_s.at[index,'temp_s'] = temp_s['temp_s'].median()
+                if refit:
+                    with instrument.stage('fit_detect'):
+                        adtk_obj.fit_detect(temp_s)
+            x0 = temp_s.at[index,'temp_s']
+            up = self._first_flag(adtk_obj, temp_s, index, 'temp_s', x0, 1, delta, seed_up)
+            down = self._first_flag(adtk_obj, temp_s, index, 'temp_s', x0, -1, delta, seed_down)
+            upper[i] = self._walk_end(x0, up, 1, delta)
+            lower[i] = self._walk_end(x0, down, -1, delta)
+            seed_up, seed_down = upper[i], lower[i] #Neighbouring points usually have nearly the same bounds
             i+=1
         out = pd.DataFrame()
         out['Values'] = self._s.copy()
         out['UCL'] = upper
         out['LCL'] = lower
         out['Violation'] = utils_ad.logic_to_numeric(self._adtk_obj.predict(self._s))
+        instrument.count('predict')
         return out
         
-    def ratio_bounds(self,numerator,denominator,delta=1):
-        """Calculate the ratio bounds for ADTK algorithms. 
+    @instrument.timed('ADTK_Bounds.ratio_bounds')
+    def ratio_bounds(self,numerator,denominator,delta=1, index=None, search_flagged=True, refit=True):
+        """Calculate the ratio bounds for ADTK algorithms. Each point's search is seeded from the bounds already found at a point with the same denominator, or else at its neighbour, and then gallops and bisects on the point's own delta grid, so most points need a handful of predict calls instead of one per step.
         
         :param float delta: Required; default 1. Offset to bounds.
         
+        :param index: Default None. If given, only these timestamps and the points the detector flags are searched; every other row gets NaN bounds.
+        
+        :param bool search_flagged: Default True. With index given, also search the flagged points outside it. Set False to search index only.
+        
+        :param bool refit: Default True. Refit the detector for each flagged point with the point replaced by the median. Set False to search flagged points against the detector as fitted, which keeps the cost independent of the length of the series.
+        
         :returns: Pandas DataFrame with ratio bound violations.
         """
         main = self._adtk_obj.predict(self._s)
+        instrument.count('predict')
         main = utils_ad.logic_to_numeric(main)
         main.columns = ['anomaly_logic']
         upper = [0]*len(self._s)
         lower = [0]*len(self._s)
+        search = None if index is None else set(index)
+        same_den = {}
+        seed_ratio = None
         i = 0
         for index in self._s.index:
-            adtk_obj = copy.deepcopy(self._adtk_obj)
-            up_temp_s = self._s.copy()
-            up = 0
-            down_temp_s = self._s.copy()
-            down = 0
-            if main.at[index,'anomaly_logic'] == 0:
-                pass
+            if search is not None and index not in search and (main.at[index,'anomaly_logic'] != 1 or not search_flagged):
+                upper[i] = float('nan')
+                lower[i] = float('nan')
+                i+=1
+                continue
+            if refit:
+                adtk_obj = copy.deepcopy(self._adtk_obj)
+                instrument.count('deepcopy')
             else:
-                up_temp_s.at[index,numerator] = (up_temp_s.at[index,denominator]*up_temp_s[numerator].median())/up_temp_s[denominator].median()
-                down_temp_s.at[index,numerator] = (down_temp_s.at[index,denominator]*down_temp_s[numerator].median())/down_temp_s[denominator].median()
-                adtk_obj.fit_detect(up_temp_s)
-            while up == 0:
-                up_temp_s.at[index,numerator] = up_temp_s.at[index,numerator] + delta
-                up_anoms = adtk_obj.predict(up_temp_s)
-                up_anoms = utils_ad.logic_to_numeric(up_anoms)
-                up_anoms.columns = ['anomaly_logic']
-                up = up_anoms.at[index,'anomaly_logic']
-
-            while down ==0:
-                down_temp_s.at[index,numerator] = down_temp_s.at[index,numerator] - delta
-                down_anoms = adtk_obj.predict(down_temp_s)
-                down_anoms = utils_ad.logic_to_numeric(down_anoms)
-                down_anoms.columns = ['anomaly_logic']
-                down = down_anoms.at[index,'anomaly_logic']
-            upper[i] = (up_temp_s.at[index,numerator]-delta)/up_temp_s.at[index,denominator]
-            lower[i] = (down_temp_s.at[index,numerator]+delta)/down_temp_s.at[index,denominator]
+                adtk_obj = self._adtk_obj
+            temp_s = self._s.astype(float) #Float copy so stepping cannot overflow downcast integer columns
+            den = temp_s.at[index,denominator]
+            if main.at[index,'anomaly_logic'] != 0:
+                temp_s.at[index,numerator] = (den*temp_s[numerator].median())/temp_s[denominator].median()
+                if refit:
+                    with instrument.stage('fit_detect'):
+                        adtk_obj.fit_detect(temp_s)
+            x0 = temp_s.at[index,numerator]
+            if den in same_den:
+                seed_up, seed_down = same_den[den]
+            elif seed_ratio is not None:
+                seed_up, seed_down = seed_ratio[0]*den, seed_ratio[1]*den
+            else:
+                seed_up, seed_down = None, None
+            up = self._first_flag(adtk_obj, temp_s, index, numerator, x0, 1, delta, seed_up)
+            down = self._first_flag(adtk_obj, temp_s, index, numerator, x0, -1, delta, seed_down)
+            up = self._walk_end(x0, up, 1, delta)
+            down = self._walk_end(x0, down, -1, delta)
+            same_den[den] = (up, down) #Seeds for later points with this denominator
+            upper[i] = up/den
+            lower[i] = down/den
+            seed_ratio = (upper[i], lower[i]) #and for the next point, scaled by its denominator
             i+=1
         out = pd.DataFrame()
         out['Values'] = self._s[numerator]/self._s[denominator]
         out['UCL'] = upper
         out['LCL'] = lower
         out['Violation'] = utils_ad.logic_to_numeric(self._adtk_obj.predict(self._s))
+        instrument.count('predict')
         return out
         
         
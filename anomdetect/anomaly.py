@@ -1,73 +1,281 @@
+import copy
+import functools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
 #import pickle as pkl
 
 import adtk.detector as ad
 from adtk.data import validate_series
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:
+    from pandas._libs.tslibs.parsing import guess_datetime_format
 
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.linear_model import LinearRegression
 
-from spc import SPC
-import utils_ad
-from adtk_bounds import ADTK_Bounds
+from .spc import SPC
+from . import utils_ad
+from .adtk_bounds import ADTK_Bounds
+from . import instrument
+from .rolling import RollingQuantile, RollingPChart
+from .sketch import StreamingQuantileAD
+from .seasonal import IncrementalSeasonalAD
+from .pca import IncrementalPcaAD
+from .regression import SufficientStatsRegressionAD
+from .storage import SparseBounds
+from .cache import fingerprint
+from . import bootstrap as bs
+from . import changepoint
+
+_STATEFUL = ('spc_rolling()', 'ad_quantile_rolling()', 'ad_seasonal_incremental()', 'ad_regression_incremental()', 'ad_pca_incremental()') #Methods whose detector absorbs what it is shown
+
+def _per_series(func):
+    #Registration methods of a multi-series Anomaly run once per series, on a view of that series
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if self.series_col is None:
+            return func(self, *args, **kwargs)
+        return self._each(func.__name__, args, kwargs)
+    return wrapper
 
 class Anomaly:
 
     """Class that allows for detecting anomalies through a variety of machine learning and control chart methodologies. Inspiration is from the ADTK library in Python, which can be found here - https://adtk.readthedocs.io/en/stable/
     """    
 
-    def __init__(self, df, var_type = "univariate", numerator=None, denominator=None):
+    def __init__(self, df, var_type = "univariate", numerator=None, denominator=None, storage="dense", series_col=None):
         self.df = df
         self.var_type = var_type #univariate, ratio
         self.date_col = None
+        self.date_format = None #Cached by validate()
+        self.freq = None #Cached by validate()
         self.s = None
         self.numerator = numerator
         self.denominator = denominator
-        if var_type == "ratio":
+        self.series_col = series_col #Long format: column identifying the series of each row
+        self.keys = None #Series ids, set by validate() when series_col is given
+        self._parts = None #Series id to (first row, end row) of its block in s
+        if series_col is not None:
+            groups = self.df[series_col]
+            if var_type == "ratio":
+                self.median = utils_ad.series_div(self.df[self.numerator],self.df[self.denominator]).groupby(groups).median()
+            elif var_type == "univariate":
+                values = self.df.drop(columns=[series_col]).select_dtypes('number')
+                self.median = values.iloc[:, 0].groupby(groups).median()
+        elif var_type == "ratio":
             self.median = utils_ad.series_div(self.df[self.numerator],self.df[self.denominator]).median()
         elif var_type == "univariate":
             self.median = self.df[self.df.columns].median()[0]
 
         self.method = [] #Stores string of the AD Method used
         self.proc = [] #Stores class call to AD Method
+        self.fingerprints = [] #cache.fingerprint() of each detector, taken before its first cached new_obs
+        self._prior = [] #(method, detector) pairs registered on the multi-series Anomaly a per-series view was made from
 
         self.bounds = [] #Stores bounds from AD Method
+        self.storage = storage #dense, sparse. Sparse keeps bounds as run-length/dictionary encoded SparseBounds, decoded by assemble() and bounds_frames()
         
-    def validate(self, date_col):
+    @instrument.timed('Anomaly.validate')
+    def validate(self, date_col, date_format=None):
         """Validates inputs to the class are the approprite type.
         
-        :param str chart: Required. Name of Date column in data frame.
+        Input that already has a sorted, unique DatetimeIndex named date_col and only numeric columns skips the date conversion, ``set_index`` and adtk's ``validate_series`` copy. The date format and index frequency found on the first call are cached, so repeated calls from new_obs do not infer them again.
+        
+        With series_col, the long frame is sorted by series id and date in a single pass and every series becomes a contiguous block of ``s``, listed in ``keys``. Detector methods then run once per series on views of its block. ``proc`` holds a dict of series id to detector per method, and bounds are one frame indexed by (series id, date).
+        
+        :param str chart: Required. Name of Date column in data frame. May already be the index, as in frames from ``ingest.read_validated``.
+        
+        :param str date_format: Default None. strftime format of date_col. Guessed from the first date and cached if not given.
         """
         self.date_col = date_col
-        self.df[self.date_col] = pd.to_datetime(self.df[self.date_col])
-        self.df = self.df.set_index(self.date_col)
-        self.s = validate_series(self.df)
+        if date_format is not None:
+            self.date_format = date_format
+        if self.series_col is not None:
+            return self._validate_long()
+        if not (self.df.index.name == self.date_col and isinstance(self.df.index, pd.DatetimeIndex)):
+            if not pd.api.types.is_datetime64_any_dtype(self.df[self.date_col]):
+                if self.date_format is None and len(self.df) > 0:
+                    self.date_format = guess_datetime_format(str(self.df[self.date_col].iloc[0]))
+                self.df[self.date_col] = pd.to_datetime(self.df[self.date_col], format=self.date_format)
+            self.df = self.df.set_index(self.date_col)
+        if self._is_validated(self.df):
+            self.s = self.df.copy(deep=False)
+            if self.s.index.freq is None:
+                self.s.index = self._with_freq(self.s.index)
+        else:
+            self.s = validate_series(self.df)
+            self.freq = self.s.index.freqstr
         if isinstance(self.s, pd.DataFrame):
             self.s = self.s.squeeze() #Squeeze down into a numpy array
         else:
             self.s = self.s
+
+    def _validate_long(self):
+        df = self.df
+        dates = df[self.date_col]
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            if self.date_format is None and len(df) > 0:
+                self.date_format = guess_datetime_format(str(dates.iloc[0]))
+            dates = pd.to_datetime(dates, format=self.date_format)
+        codes, keys = pd.factorize(df[self.series_col], sort=True)
+        dates = dates.to_numpy()
+        order = np.lexsort((dates, codes)) #One stable sort by series then date partitions every series at once
+        codes, dates = codes[order], dates[order]
+        keep = np.ones(len(order), dtype=bool)
+        keep[1:] = (codes[1:] != codes[:-1]) | (dates[1:] != dates[:-1]) #Duplicated timestamps keep their first row, as validate_series does
+        order, codes, dates = order[keep], codes[keep], dates[keep]
+        columns = [c for c in df.columns if c not in (self.series_col, self.date_col)]
+        self.df = pd.DataFrame({c: df[c].to_numpy()[order] for c in columns}, index=pd.DatetimeIndex(dates, name=self.date_col), copy=False)
+        self.s = self.df if self.var_type == "ratio" else self.df.iloc[:, 0]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=int)
+        ends = np.r_[starts[1:], len(codes)]
+        self.keys = keys[codes[starts]]
+        self._parts = dict(zip(self.keys, zip(starts, ends)))
+
+    def _part(self, key):
+        lo, hi = self._parts[key]
+        part = copy.copy(self) #Shares settings, only the frames and registration lists are its own
+        part.series_col = None
+        part.storage = "dense"
+        part.df = self.df.iloc[lo:hi]
+        part.s = self.s.iloc[lo:hi]
+        part.s.index = part._with_freq(part.s.index)
+        part.median = self.median[key]
+        part.method, part.proc, part.bounds, part.fingerprints = [], [], [], []
+        part._prior = [(method, proc[key]) for method, proc in zip(self.method, self.proc) if key in proc]
+        return part
+
+    def _each(self, name, args, kwargs):
+        outputs, parts = [], []
+        for key in self.keys:
+            part = self._part(key)
+            outputs.append(getattr(part, name)(*args, **kwargs))
+            parts.append(part)
+        if len(parts) > 0 and len(parts[0].method) > 0:
+            self.method += parts[0].method
+            for j in range(len(parts[0].proc)):
+                self.proc.append({key: part.proc[j] for key, part in zip(self.keys, parts)})
+            for j in range(len(parts[0].bounds)):
+                self.bounds.append(self._keep(self._stack([part.bounds[j] for part in parts])))
+            return outputs[0]
+        if all(isinstance(out, pd.DataFrame) for out in outputs):
+            return self._stack(outputs)
+        return outputs[0] if outputs else None
+
+    def _stack(self, frames):
+        return pd.concat(frames, keys=self.keys, names=[self.series_col])
+
+    def _medians(self, index):
+        if self.series_col is None:
+            return [self.median]*len(index)
+        return self.median.reindex(index.get_level_values(0)).to_numpy()
+
+    def _keep(self, bounds):
+        if self.storage == "sparse" and isinstance(bounds, pd.DataFrame):
+            return SparseBounds(bounds)
+        return bounds
+
+    def bounds_frames(self):
+        """Stored bounds as DataFrames, decoding any kept in sparse storage.
+        
+        :returns: list of DataFrames in the same order as method.
+        """
+        return [b.to_frame() if isinstance(b, SparseBounds) else b for b in self.bounds]
+
+    def _is_validated(self, df):
+        return (df.index.is_monotonic_increasing and df.index.is_unique
+                and all(pd.api.types.is_numeric_dtype(t) for t in df.dtypes))
+
+    def _with_freq(self, index):
+        if self.freq is not None:
+            try:
+                return pd.DatetimeIndex(index, freq=self.freq)
+            except ValueError:
+                pass #Cached frequency no longer fits, infer it again
+        self.freq = index.inferred_freq if len(index) > 2 else None
+        if self.freq is None:
+            return index
+        return pd.DatetimeIndex(index, freq=self.freq)
         
-    def spc(self, chart, test=True):
+    @instrument.timed('Anomaly.phase_one')
+    def phase_one(self, penalty=None, min_size=5, min_length=20):
+        """Phase I baseline selection. Searches the series for changepoints in its level with changepoint.pelt() and trims the baseline to the most recent stable segment that is at least ``min_length`` rows long, so detectors fit afterwards are not inflated by older level shifts. Ratio metrics are searched on the ratio, weighted by the denominator. The median is recomputed over the kept rows. Run after validate() and before fitting detectors.
+        
+        :param float penalty: Default None. Passed to changepoint.pelt().
+        
+        :param int min_size: Default 5. Passed to changepoint.pelt().
+        
+        :param int min_length: Default 20. Minimum number of rows kept. See changepoint.stable_start().
+        
+        :returns: Timestamp the kept baseline starts at, or a Series of them by series id if series_col was given.
+        """
+        if self.series_col is not None:
+            starts = {}
+            for key in self.keys:
+                part = self._part(key)
+                starts[key] = part.phase_one(penalty, min_size, min_length)
+                if isinstance(starts[key], str):
+                    return starts[key]
+                lo, hi = self._parts[key]
+                self._parts[key] = (hi - len(part.s), hi)
+                self.median[key] = part.median
+            return pd.Series(starts, name=self.date_col).rename_axis(self.series_col)
+        if self.var_type == "ratio":
+            start = changepoint.stable_start(self.s[self.numerator]/self.s[self.denominator], self.s[self.denominator], penalty, min_size, min_length)
+        elif self.var_type == "univariate":
+            start = changepoint.stable_start(self.s, None, penalty, min_size, min_length)
+        else:
+            return "No other var_types built at this time"
+        self.df = self.df.iloc[start:]
+        self.s = self.s.iloc[start:]
+        if self.var_type == "ratio":
+            self.median = utils_ad.series_div(self.s[self.numerator],self.s[self.denominator]).median()
+        else:
+            self.median = self.s.median()
+        return self.s.index[0]
+
+    @instrument.timed('Anomaly.spc')
+    @_per_series
+    def spc(self, chart, test=True, window=None, phase_one=False):
         """Runs an SPC chart based on the chosen chart type.
         
         :param str chart: Required. Current options: "p".
         
         :param bool test: Default True. Returns chart bounds for a given metric in order to validate its use and appropriateness.
         
+        :param int window: Default None. If set, pbar is recomputed over the last ``window`` observations before every timestamp instead of once over the whole baseline.
+        
+        :param bool phase_one: Default False. If True, pbar is taken over the most recent stable segment of the baseline only. See SPC.p_chart().
+        
         :returns: None.
         """
-        if chart == "p":
-            spc = SPC(self.df)
-            spc.p_chart(self.numerator, self.denominator)
+        if chart == "p" and window is not None:
+            spc = RollingPChart(window, self.numerator, self.denominator)
+            bounds = spc.fit(self.df)
+            if test:
+                return bounds
+            else:
+                self.method.append('spc_rolling()')
+                self.proc.append(spc)
+                self.bounds.append(self._keep(bounds))
+                return "Added: spc_rolling()"
+        elif chart == "p":
+            spc = SPC(self.df.copy(deep=False)) #SPC adds its own columns, keep them off the frame other detectors share
+            spc.p_chart(self.numerator, self.denominator, phase_one=phase_one)
             if test:
                 return spc.bounds()
             else:
                 self.method.append('spc()')
                 self.proc.append(spc)
-                self.bounds.append(spc.bounds())
+                self.bounds.append(self._keep(spc.bounds()))
                 return "Added: spc()"
         
-    def ad_quantile(self,high=0.99, low=0.01, delta=.0001, test=True):
+    @instrument.timed('Anomaly.ad_quantile')
+    @_per_series
+    def ad_quantile(self,high=0.99, low=0.01, delta=.0001, test=True, window=None, index=None):
         """Fits an Anomaly Detection Quantile chart.
         
         :param float high: Required, default .99. Must be float between 0 and 1. Determines violation range for upper bound.
@@ -78,20 +286,28 @@ class Anomaly:
         
         :param bool test: Default True. Returns chart bounds for a given metric in order to validate its use and appropriateness.
         
+        :param int window: Default None. If set, the quantiles are taken over the last ``window`` observations before every timestamp instead of once over the whole baseline. Bounds are read directly off the window, so delta is not used.
+        
+        :param index: Default None. Restricts the bound search to these timestamps plus any flagged point; other rows get NaN bounds. Used by multi_resolution().
+        
         :returns: Bounds if test = True, message validating ad_quantile() is added to class parameters if test = False.
         """
+        if window is not None:
+            return self._ad_quantile_rolling(high, low, window, test)
         quantile_ad = ad.QuantileAD(high=high, low=low)
         if self.var_type == "ratio":
             s = utils_ad.num_den_to_ratio(self.s,self.numerator,self.denominator)
-            quantile_ad.fit_detect(s)
+            with instrument.stage('fit_detect'):
+                quantile_ad.fit_detect(s)
             bounds = ADTK_Bounds(adtk_obj=quantile_ad,s=s)
-            bounds = bounds.univ_bounds(delta = delta) #Yes, univariate bounds are used here and not ratio 
+            bounds = bounds.univ_bounds(delta = delta, index=index) #Yes, univariate bounds are used here and not ratio 
             #Ratio var_type for ad_quantile treats the ratio as if it's univariate
             #Plots univariate bounds on z for z = numerator/denominator
         elif self.var_type == "univariate":
-            quantile_ad.fit_detect(self.s)
+            with instrument.stage('fit_detect'):
+                quantile_ad.fit_detect(self.s)
             bounds = ADTK_Bounds(adtk_obj=quantile_ad,s=self.s)
-            bounds = bounds.univ_bounds(delta=delta)
+            bounds = bounds.univ_bounds(delta=delta, index=index)
         else:
             return "No other var_types built at this time"
         if test:
@@ -99,10 +315,61 @@ class Anomaly:
         else:
             self.method.append('ad_quantile()')
             self.proc.append(quantile_ad)
-            self.bounds.append(bounds)
+            self.bounds.append(self._keep(bounds))
             return "Added: ad_quantile()"
 
-    def ad_seasonal(self,c=3.0, side="both", test=True):
+    def _ad_quantile_rolling(self, high, low, window, test):
+        quantile_ad = RollingQuantile(window, high=high, low=low)
+        if self.var_type == "ratio":
+            s = utils_ad.num_den_to_ratio(self.s,self.numerator,self.denominator)
+            bounds = quantile_ad.fit(s)
+        elif self.var_type == "univariate":
+            bounds = quantile_ad.fit(self.s)
+        else:
+            return "No other var_types built at this time"
+        if test:
+            return bounds
+        else:
+            self.method.append('ad_quantile_rolling()')
+            self.proc.append(quantile_ad)
+            self.bounds.append(self._keep(bounds))
+            return "Added: ad_quantile_rolling()"
+
+    @instrument.timed('Anomaly.ad_quantile_sketch')
+    @_per_series
+    def ad_quantile_sketch(self, high=0.99, low=0.01, k=200, test=True):
+        """Fits an Anomaly Detection Quantile chart whose thresholds come from a bounded-memory KLL sketch rather than the full history. Further history can be streamed in, or sketches from other workers merged, through the detector stored in ``proc``.
+        
+        :param float high: Required, default .99. Must be float between 0 and 1. Determines violation range for upper bound.
+        
+        :param float low: Required, default .01. Must be float between 0 and 1. Determines violation range for lower bound.
+        
+        :param int k: Default 200. Sketch size. Rank error of the thresholds is about 1.65% at k=200 and shrinks roughly as 1/k.
+        
+        :param bool test: Default True. Returns chart bounds for a given metric in order to validate its use and appropriateness.
+        
+        :returns: Bounds if test = True, message validating ad_quantile_sketch() is added to class parameters if test = False.
+        """
+        quantile_ad = StreamingQuantileAD(high=high, low=low, k=k)
+        if self.var_type == "ratio":
+            s = utils_ad.num_den_to_ratio(self.s,self.numerator,self.denominator)
+        elif self.var_type == "univariate":
+            s = self.s
+        else:
+            return "No other var_types built at this time"
+        quantile_ad.fit(s)
+        bounds = quantile_ad.bounds(s)
+        if test:
+            return bounds
+        else:
+            self.method.append('ad_quantile_sketch()')
+            self.proc.append(quantile_ad)
+            self.bounds.append(self._keep(bounds))
+            return "Added: ad_quantile_sketch()"
+
+    @instrument.timed('Anomaly.ad_seasonal')
+    @_per_series
+    def ad_seasonal(self,c=3.0, side="both", test=True, index=None, incremental=False):
         """Fits an Anomaly Detection Seasonal chart.
         
         :param float c: Default 3.0. Factor used to determine the bound of normal range based on historical interquartile range.
@@ -114,18 +381,26 @@ class Anomaly:
         
         :param bool test: Default True. Returns chart bounds for a given metric in order to validate its use and appropriateness.
         
+        :param index: Default None. Restricts the bound search to these timestamps plus any flagged point; other rows get NaN bounds. Used by multi_resolution().
+        
+        :param bool incremental: Default False. Use IncrementalSeasonalAD, which caches the seasonal period and updates the per-phase profile and residual quantiles as new_obs brings in new observations instead of reusing a frozen fit. Bounds come straight from the profile, so index is not used.
+        
         :returns: Bounds if test = True, message validating ad_seasonal() is added to class parameters if test = False.
         """
+        if incremental:
+            return self._ad_seasonal_incremental(c, side, test)
         seasonal_ad = ad.SeasonalAD(c=c, side=side)
         if self.var_type == "ratio":
             s = utils_ad.num_den_to_ratio(self.s,self.numerator,self.denominator)
-            seasonal_ad.fit_detect(s)
+            with instrument.stage('fit_detect'):
+                seasonal_ad.fit_detect(s)
             bounds = ADTK_Bounds(adtk_obj=seasonal_ad,s=s)
-            bounds = bounds.ratio_bounds(self.numerator,self.denominator)
+            bounds = bounds.ratio_bounds(self.numerator,self.denominator,index=index)
         elif self.var_type == "univariate":
-            seasonal_ad.fit_detect(self.s)
+            with instrument.stage('fit_detect'):
+                seasonal_ad.fit_detect(self.s)
             bounds = ADTK_Bounds(adtk_obj=seasonal_ad,s=self.s)
-            bounds = bounds.univ_bounds()
+            bounds = bounds.univ_bounds(index=index)
         else:
             return "No other var_types built at this time"
         if test:
@@ -133,23 +408,71 @@ class Anomaly:
         else:
             self.method.append('ad_seasonal()')
             self.proc.append(seasonal_ad)
-            self.bounds.append(bounds)
+            self.bounds.append(self._keep(bounds))
             return "Added: ad_seasonal()"
         
-    def ad_kmeans_high_dim(self, n_clusters=3, test=True):
+    def _ad_seasonal_incremental(self, c, side, test):
+        seasonal_ad = IncrementalSeasonalAD(c=c, side=side)
+        if self.var_type == "ratio":
+            s = utils_ad.num_den_to_ratio(self.s,self.numerator,self.denominator)
+        elif self.var_type == "univariate":
+            s = self.s
+        else:
+            return "No other var_types built at this time"
+        with instrument.stage('fit_detect'):
+            seasonal_ad.fit(s)
+        bounds = seasonal_ad.bounds(s)
+        if test:
+            return bounds
+        else:
+            self.method.append('ad_seasonal_incremental()')
+            self.proc.append(seasonal_ad)
+            self.bounds.append(self._keep(bounds))
+            return "Added: ad_seasonal_incremental()"
+
+    @instrument.timed('Anomaly.ad_kmeans_high_dim')
+    @_per_series
+    def ad_kmeans_high_dim(self, n_clusters=3, test=True, index=None, engine="kmeans", warm_start=False, sample_size=None, random_state=None):
         """Fits an Anomaly Detection K-Means Chart, which detects anomalies based on clustering of historical data.
         
         :param int n_clusters: Number of clusters to form. Default is 3.
         
         :param bool test: Default True. Returns chart bounds for a given metric in order to validate its use and appropriateness.
         
+        :param index: Default None. Restricts the bound search to these timestamps plus any flagged point; other rows get NaN bounds. Used by multi_resolution().
+        
+        :param str engine: Default "kmeans". Clustering engine.
+        - If "kmeans", full-batch ``sklearn.cluster.KMeans``;
+        - If "minibatch", ``sklearn.cluster.MiniBatchKMeans``, which scales to millions of rows.
+        
+        :param bool warm_start: Default False. Start from the centroids of the last ad_kmeans_high_dim() fit stored in ``proc`` instead of random centroids, if it has the same shape. With series_col, each series starts from its own last fit.
+        
+        :param int sample_size: Default None. Fit on a subsample of this many rows, stratified over time (one random row from each of sample_size equal slices of the history), then assign every row to a cluster in one vectorized predict.
+        
+        :param int random_state: Default None. Seed for the clustering engine and the subsample.
+        
         :returns: Bounds if test = True, message validating ad_kmeans_high_dim() is added to class parameters if test = False.
         """
-        min_cluster_detector = ad.MinClusterDetector(KMeans(n_clusters=n_clusters))
-        min_cluster_detector.fit_detect(self.s)
+        init = self._kmeans_centroids(n_clusters) if warm_start else None
+        if engine == "minibatch":
+            model = MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state, **({} if init is None else {'init': init, 'n_init': 1}))
+        elif engine == "kmeans":
+            model = KMeans(n_clusters=n_clusters, random_state=random_state, **({} if init is None else {'init': init, 'n_init': 1}))
+        else:
+            return "No other engines built at this time"
+        min_cluster_detector = ad.MinClusterDetector(model)
+        if sample_size is not None and sample_size < len(self.s):
+            rng = np.random.default_rng(random_state)
+            edges = np.linspace(0, len(self.s), sample_size+1).astype(int)
+            rows = edges[:-1] + (rng.random(sample_size)*(edges[1:]-edges[:-1])).astype(int)
+            with instrument.stage('fit_detect'):
+                min_cluster_detector.fit(self.s.iloc[rows])
+        else:
+            with instrument.stage('fit_detect'):
+                min_cluster_detector.fit_detect(self.s)
         if self.var_type == "ratio":
             bounds = ADTK_Bounds(adtk_obj=min_cluster_detector,s=self.s)
-            bounds = bounds.ratio_bounds(self.numerator,self.denominator)
+            bounds = bounds.ratio_bounds(self.numerator,self.denominator,index=index)
         elif self.var_type == "univariate":
             return "Method does not support var_type: univariate"
         else:
@@ -159,23 +482,43 @@ class Anomaly:
         else:
             self.method.append('ad_kmeans_high_dim()')
             self.proc.append(min_cluster_detector)
-            self.bounds.append(bounds)
+            self.bounds.append(self._keep(bounds))
             return "Added: ad_kmeans_high_dim()"
         
-    def ad_regression(self, c=3.0, test=True):
+    def _kmeans_centroids(self, n_clusters):
+        registered = self._prior + list(zip(self.method, self.proc)) #A per-series view finds its series' earlier fits in _prior
+        for method, proc in reversed(registered):
+            if method == 'ad_kmeans_high_dim()':
+                centers = getattr(proc.model, 'cluster_centers_', None)
+                if centers is not None and centers.shape == (n_clusters, self.s.shape[1]):
+                    return centers
+        return None
+
+    @instrument.timed('Anomaly.ad_regression')
+    @_per_series
+    def ad_regression(self, c=3.0, test=True, index=None, incremental=False, window=None):
         """Fits an Anomaly Detection Regression Chart, which detects anomalies based on a regression relationship.
         
         :param float c: Default 3.0. Factor used to determine the bound of normal range based on historical interquartile range.
         
         :param bool test: Default True. Returns chart bounds for a given metric in order to validate its use and appropriateness.
         
+        :param index: Default None. Restricts the bound search to these timestamps plus any flagged point; other rows get NaN bounds. Used by multi_resolution().
+        
+        :param bool incremental: Default False. Use SufficientStatsRegressionAD, which stores XᵀX and Xᵀy with a residual quantile sketch, so new_obs updates the fit in O(new rows) instead of reusing a frozen one. Bounds are solved for directly, so index is not used.
+        
+        :param int window: Default None. Fit on the last window complete rows only, subtracting rows as they drop out. Implies incremental.
+        
         :returns: Bounds if test = True, message validating ad_regression() is added to class parameters if test = False.
         """
+        if incremental or window is not None:
+            return self._ad_regression_incremental(c, window, test)
         regression_ad = ad.RegressionAD(regressor=LinearRegression(), target=self.numerator, c=c)
-        regression_ad.fit_detect(self.s)
+        with instrument.stage('fit_detect'):
+            regression_ad.fit_detect(self.s)
         if self.var_type == 'ratio':
             bounds = ADTK_Bounds(adtk_obj=regression_ad,s=self.s)
-            bounds = bounds.ratio_bounds(self.numerator,self.denominator)
+            bounds = bounds.ratio_bounds(self.numerator,self.denominator,index=index)
         elif self.var_type == "univariate":
             return "Mehtod does not support var_type: univariate"
         else:
@@ -185,23 +528,52 @@ class Anomaly:
         else:
             self.method.append('ad_regression()')
             self.proc.append(regression_ad)
-            self.bounds.append(bounds)
+            self.bounds.append(self._keep(bounds))
             return "Added: ad_regression()"
+
+    def _ad_regression_incremental(self, c, window, test):
+        regression_ad = SufficientStatsRegressionAD(target=self.numerator, c=c, window=window)
+        if self.var_type == 'ratio':
+            with instrument.stage('fit_detect'):
+                regression_ad.fit(self.s)
+            bounds = regression_ad.bounds(self.s, self.denominator)
+        elif self.var_type == "univariate":
+            return "Mehtod does not support var_type: univariate"
+        else:
+            return "No other var_types built at this time"
+        if test:
+            return bounds
+        else:
+            self.method.append('ad_regression_incremental()')
+            self.proc.append(regression_ad)
+            self.bounds.append(self._keep(bounds))
+            return "Added: ad_regression_incremental()"
             
-    def ad_pca(self, k=1, test=True):
+    @instrument.timed('Anomaly.ad_pca')
+    @_per_series
+    def ad_pca(self, k=1, test=True, index=None, incremental=False, chunksize=10000):
         """Fits an Anomaly Detection Principal Component Analysis (PCA) Chart, which performs principal component analysis (PCA) to the multivariate time series (every time point is treated as a point in high-dimensional space), measures reconstruction error at every time point, and identifies a time point as anomalous when the recontruction error is beyond anomalously large.
         
         :param int k: Default 1. Number of principal components to use.
         
         :param bool test: Default True. Returns chart bounds for a given metric in order to validate its use and appropriateness.
         
+        :param index: Default None. Restricts the bound search to these timestamps plus any flagged point; other rows get NaN bounds. Used by multi_resolution().
+        
+        :param bool incremental: Default False. Use IncrementalPcaAD, which fits the components chunk by chunk and keeps reconstruction-error quartiles in a sketch, so the frame is never decomposed in one batch and new_obs updates the fit instead of reusing a frozen one. Bounds are solved for directly, so index is not used.
+        
+        :param int chunksize: Default 10000. Rows per chunk when incremental is True.
+        
         :returns: Bounds if test = True, message validating ad_pca() is added to class parameters if test = False.
         """
+        if incremental:
+            return self._ad_pca_incremental(k, test, chunksize)
         pca_ad = ad.PcaAD(k=k)
-        pca_ad.fit_detect(self.s)
+        with instrument.stage('fit_detect'):
+            pca_ad.fit_detect(self.s)
         if self.var_type == 'ratio':
             bounds = ADTK_Bounds(adtk_obj=pca_ad,s=self.s)
-            bounds = bounds.ratio_bounds(self.numerator,self.denominator)
+            bounds = bounds.ratio_bounds(self.numerator,self.denominator,index=index)
         elif self.var_type == "univariate":
             return "Mehtod does not support var_type: univariate"
         else:
@@ -211,102 +583,352 @@ class Anomaly:
         else:
             self.method.append('ad_pca()')
             self.proc.append(pca_ad)
-            self.bounds.append(bounds)
+            self.bounds.append(self._keep(bounds))
             return "Added: ad_pca()"
+
+    def _ad_pca_incremental(self, k, test, chunksize):
+        pca_ad = IncrementalPcaAD(k=k, chunksize=chunksize)
+        if self.var_type == 'ratio':
+            with instrument.stage('fit_detect'):
+                pca_ad.fit(self.s)
+            bounds = pca_ad.bounds(self.s, self.numerator, self.denominator)
+        elif self.var_type == "univariate":
+            return "Mehtod does not support var_type: univariate"
+        else:
+            return "No other var_types built at this time"
+        if test:
+            return bounds
+        else:
+            self.method.append('ad_pca_incremental()')
+            self.proc.append(pca_ad)
+            self.bounds.append(self._keep(bounds))
+            return "Added: ad_pca_incremental()"
             
+    @instrument.timed('Anomaly.multi_resolution')
+    @_per_series
+    def multi_resolution(self, freq, chart, test=True, **kwargs):
+        """Coarse-to-fine scan for long, high-frequency series. The series is first aggregated to ``freq`` (numerator and denominator are summed for ratio metrics, univariate metrics are averaged) and the chosen detector is run at that grain, searching bounds only at the coarse points it flags. The detector is then fit at full resolution, but the bound search only runs inside the coarse windows that were flagged and at points the full-resolution detector flags itself. Every other row gets NaN bounds, so the cost of the search grows with the anomalous fraction rather than the row count. assemble() leaves those rows to the other registered methods.
+        
+        :param str freq: Required. Coarse grain as a pandas frequency string, e.g. "H" or "D".
+        
+        :param str chart: Required. Name of the detector method to run. Current options: "ad_quantile", "ad_seasonal", "ad_kmeans_high_dim", "ad_regression", "ad_pca".
+        
+        :param bool test: Default True. Returns chart bounds for a given metric in order to validate its use and appropriateness.
+        
+        :param kwargs: Passed on to the detector method at both grains.
+        
+        :returns: Bounds if test = True, message validating the detector is added to class parameters if test = False.
+        """
+        if chart not in ('ad_quantile', 'ad_seasonal', 'ad_kmeans_high_dim', 'ad_regression', 'ad_pca'):
+            return "Method does not support multi-resolution: " + chart
+        keys = self.df.index.to_period(freq).to_timestamp()
+        keys.name = self.date_col
+        if self.var_type == "ratio":
+            coarse_df = self.df[[self.numerator, self.denominator]].groupby(keys).sum()
+        else:
+            coarse_df = self.df.groupby(keys).mean()
+        coarse = Anomaly(coarse_df, var_type=self.var_type, numerator=self.numerator, denominator=self.denominator)
+        coarse.validate(self.date_col)
+        coarse_bounds = getattr(coarse, chart)(test=True, index=coarse.df.index[:0], **kwargs) #Only the flagged coarse points need bounds
+        if isinstance(coarse_bounds, str):
+            return coarse_bounds
+        flagged = coarse_bounds.index[coarse_bounds['Violation'] == 1]
+        index = self.df.index[keys.isin(flagged)]
+        return getattr(self, chart)(test=test, index=index, **kwargs)
+
+    @instrument.timed('Anomaly.bootstrap')
+    @_per_series
+    def bootstrap(self, chart, high=0.99, low=0.01, n_boot=1000, alpha=0.05, seed=None, n_jobs=None):
+        """Bootstrap confidence intervals for the limits a chart would fit on the baseline, to judge whether the baseline is long enough for them to be trusted.
+        
+        :param str chart: Required. Current options: "p" for pbar and the p-chart limits, "ad_quantile" for the quantile thresholds.
+        
+        :param float high: Default .99. Upper quantile, used by "ad_quantile".
+        
+        :param float low: Default .01. Lower quantile, used by "ad_quantile".
+        
+        :param int n_boot: Default 1000. Number of resamples.
+        
+        :param float alpha: Default 0.05. 1 - confidence level.
+        
+        :param int seed: Default None. Seed for the resamples.
+        
+        :param int n_jobs: Default None. Number of threads resamples are spread over.
+        
+        :returns: For "p", the output of SPC.bootstrap(). For "ad_quantile", a DataFrame indexed by "high" and "low" with the columns estimate, lower and upper.
+        """
+        if chart == "p":
+            if self.var_type != "ratio":
+                return "No other var_types built at this time"
+            spc = SPC(self.df.copy(deep=False))
+            spc.p_chart(self.numerator, self.denominator)
+            return spc.bootstrap(n_boot, alpha, seed, n_jobs)
+        elif chart == "ad_quantile":
+            if self.var_type == "ratio":
+                s = utils_ad.num_den_to_ratio(self.s,self.numerator,self.denominator)
+            elif self.var_type == "univariate":
+                s = self.s
+            else:
+                return "No other var_types built at this time"
+            s = s.dropna() #QuantileAD skips missing values too
+            thresholds = bs.resample(s, lambda m: np.quantile(m, [high, low], axis=1).T, n_boot, seed, n_jobs)
+            lower, upper = bs.interval(thresholds, alpha)
+            return pd.DataFrame({'estimate':np.quantile(s, [high, low]), 'lower':lower, 'upper':upper}, index=['high', 'low'])
+        else:
+            return "Method does not support bootstrap: " + chart
+
+    @instrument.timed('Anomaly.assemble')
     def assemble(self,weights=None):
         """Combine multiple anomaly detection algorithms based on a pre-provided weighting.
         
-        :param list weights: Stores a list of weights to assign to each anomaly detection algorithm. Sum of values provided to weights must be equal to 1.
+        :param list weights: Stores a list of weights to assign to each anomaly detection algorithm. Sum of values provided to weights must be equal to 1. Equal weights if None. Where a method has no bounds for a row, as outside the windows multi_resolution() searched, the other methods' weights are rescaled to sum to 1 for that row.
         
         :returns: concatenated DataFrame with combined AD predictions.
         """
         if len(self.bounds) == 1:
-            concatenated = self.bounds[0]
-            concatenated['Median'] = [self.median]*len(concatenated)
+            concatenated = self.bounds_frames()[0]
+            concatenated['Median'] = self._medians(concatenated.index)
             return concatenated
-        elif weights is None:
+        if weights is None:
             weights = [1/len(self.bounds)]*len(self.bounds)
         elif sum(weights) != 1:
             raise "sum of object: weights must be equal to 1"
-        else:
-            i = 0
-            for df in self.bounds:
-                df = utils_ad.logic_to_numeric(df)
-                df = df.apply(lambda x: x*weights[i])
-                self.bounds[i] = df
-                i+=1
-            concatenated = pd.concat(self.bounds, axis=1)
-            concatenated = concatenated.groupby(lambda x:x, axis=1).sum()
-        concatenated['Median'] = [self.median]*len(concatenated)
+        i = 0
+        numeric = []
+        for df in self.bounds_frames():
+            df = utils_ad.logic_to_numeric(df)
+            numeric.append(df)
+            self.bounds[i] = self._keep(df.apply(lambda x: x*weights[i]))
+            i+=1
+        concatenated = utils_ad.weighted_sum(numeric, weights)
+        concatenated['Median'] = self._medians(concatenated.index)
         return concatenated
     
-    def new_obs(self,df):
+    @instrument.timed('Anomaly.fit_all')
+    def fit_all(self, recipe, n_jobs=None, backend="thread"):
+        """Fits several detectors in one call and adds them to class parameters, as if each was called with test = False.
+        
+        :param list recipe: Required. List of (method name, dict of keyword arguments) pairs, e.g. [("spc", {"chart": "p"}), ("ad_quantile", {"high": 0.95})].
+        
+        :param int n_jobs: Default None. Number of detectors to fit at once. If None, they are fit one after another in the calling thread.
+        
+        :param str backend: Default "thread".
+        - If "thread", detectors run in a thread pool and share the validated series without copying it. numpy, pandas and scikit-learn release the GIL in most of their heavy loops;
+        - If "process", detectors run in a process pool. The Anomaly is pickled once per worker process rather than once per detector.
+        
+        :returns: list of messages in recipe order. Detectors are added to class parameters in recipe order too, whichever finishes first.
+        """
+        results = self._dispatch(_fit_task, recipe, n_jobs, backend)
+        messages = []
+        for method, proc, bounds, message in results:
+            self.method += method
+            self.proc += proc
+            self.bounds += bounds
+            messages.append(message)
+        return messages
+
+    def _fit_one(self, name, kwargs):
+        worker = copy.copy(self) #Shares df and s, only the registration lists are its own
+        worker.method, worker.proc, worker.bounds = list(self.method), list(self.proc), list(self.bounds)
+        message = getattr(worker, name)(test=False, **kwargs)
+        n = len(self.method)
+        return worker.method[n:], worker.proc[n:], worker.bounds[n:], message
+
+    def _dispatch(self, task, items, n_jobs, backend):
+        if n_jobs is None:
+            return [task(item, self) for item in items]
+        if backend == "thread":
+            with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+                return list(pool.map(task, items, [self]*len(items)))
+        elif backend == "process":
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(self,)) as pool:
+                return list(pool.map(task, items))
+        else:
+            raise ValueError("backend must be 'thread' or 'process'")
+
+    @instrument.timed('Anomaly.new_obs')
+    def new_obs(self,df, n_jobs=None, backend="thread", cache=None, metric=None):
         """Applies previous fit of anomaly detection algorithms to new observations for control charts.
         
         :param DataFrame df: A data frame including new observations to be fit on.
         
+        :param int n_jobs: Default None. Number of detectors to run at once. If None, they run one after another in the calling thread. With series_col, this many series run at once instead, all in one pool, and each series runs its detectors one after another.
+        
+        :param str backend: Default "thread". "thread" or "process", see fit_all(). With "process", detectors that update their state (rolling, sketch and incremental methods) are sent back from the workers and replace the ones in ``proc``.
+        
+        :param BoundsCache cache: Default None. On-disk cache of earlier bounds. Rows it already holds keep their cached bounds and only the rows after them are bounded, then the cache is rewritten. Rolling and incremental detectors are run over every row instead, so their state also covers the cached rows. If any cached row changed in df, the entry is discarded and every row is bounded again. Entries are only reused by detectors with the same parameters and fit as the ones that wrote them.
+        
+        :param str metric: Default None. Name of the metric in the cache. Required with cache. Series of a multi-series Anomaly are cached as "<metric>/<series id>".
+        
         :returns: None.
         """
         self.df = df
         self.validate(self.date_col)
-        self.bounds = []
-        j = 0
-        for i in self.method:
-            if i == 'spc()':
-                spc = self.proc[j]
-                spc.predict(self.s)
-                self.bounds.append(spc.bounds(predict=True))
-                j+=1
-            elif i == 'ad_quantile()':
-                quantile_ad = self.proc[j]
-                if self.var_type == 'ratio':
-                    s = utils_ad.num_den_to_ratio(self.s,self.numerator,self.denominator)
-                    bounds = ADTK_Bounds(adtk_obj=quantile_ad,s=s)
-                    bounds = bounds.univ_bounds()
-                    self.bounds.append(bounds)
-                else:
-                    print("No other var_types built at this time")
-                j+=1
-            elif i == 'ad_seasonal()':
-                ad_seasonal = self.proc[j]
-                if self.var_type == 'ratio':
-                    s = utils_ad.num_den_to_ratio(self.s,self.numerator,self.denominator)
-                    bounds = ADTK_Bounds(adtk_obj=ad_seasonal,s=s)
-                    bounds = bounds.univ_bounds()
-                    self.bounds.append(bounds)
-                else:
-                    print("No other var_types built at this time")
-                j+=1
-            elif i == 'ad_kmeans_high_dim()':
-                min_cluster_detector = self.proc[j]
-                if self.var_type == 'ratio':
-                    bounds = ADTK_Bounds(adtk_obj=min_cluster_detector,s=self.s)
-                    bounds = bounds.ratio_bounds(self.numerator,self.denominator)
-                    self.bounds.append(bounds)
-                else:
-                    print("No other var_types built at this time")
-                j+=1
-            elif i == 'ad_regression()':
-                regression_ad = self.proc[j]
-                if self.var_type == 'ratio':
-                    bounds = ADTK_Bounds(adtk_obj=regression_ad,s=self.s)
-                    bounds = bounds.ratio_bounds(self.numerator,self.denominator)
-                    self.bounds.append(bounds)
-                else:
-                    print("No other var_types built at this time")
-                j+=1
-            elif i == 'ad_pca()':
-                pca_ad = self.proc[j]
-                if self.var_type == 'ratio':
-                    bounds = ADTK_Bounds(adtk_obj=pca_ad,s=self.s)
-                    bounds = bounds.ratio_bounds(self.numerator,self.denominator)
-                    self.bounds.append(bounds)
-                else:
-                    print("No other var_types built at this time")
-                j+=1
+        if self.series_col is None:
+            return self._new_bounds(n_jobs, backend, cache, metric)
+        frames = [[] for i in self.bounds]
+        procs = [{} for i in self.proc]
+        fingerprints = [dict(f) for f in self.fingerprints] + [{} for i in self.proc[len(self.fingerprints):]]
+        keys = [key for key in self.keys if all(key in proc for proc in self.proc)] #Series without a fit are left out
+        results = self._dispatch(_series_task, [(key, cache, metric) for key in keys], n_jobs, backend) #One pool for every series, each series runs its detectors in turn
+        for key, (proc, bounds, prints) in zip(keys, results):
+            for j in range(len(procs)):
+                procs[j][key] = proc[j]
+            for j in range(len(prints)):
+                fingerprints[j][key] = prints[j]
+            for j in range(len(frames)):
+                frames[j].append(bounds[j])
+        self.proc = procs
+        self.fingerprints = [f for f in fingerprints if f]
+        self.keys = pd.Index(keys, name=self.keys.name)
+        self.bounds = [self._keep(self._stack(f)) for f in frames]
+
+    def _series_bounds(self, key, cache, metric):
+        part = self._part(key)
+        part.method, part.proc = list(self.method), [proc[key] for proc in self.proc]
+        part.fingerprints = [f[key] for f in self.fingerprints if key in f]
+        part._new_bounds(None, None, cache, None if metric is None else "%s/%s" % (metric, key))
+        return part.proc, part.bounds, part.fingerprints
+
+    def _new_bounds(self, n_jobs, backend, cache, metric):
+        if cache is not None:
+            #Taken once, before the detector first absorbs observations, so stateful detectors keep matching the entries they write
+            self.fingerprints = self.fingerprints[:len(self.proc)] + [fingerprint(proc) for proc in self.proc[len(self.fingerprints):]]
+        cached = None if cache is None else cache.load(metric, self.method, self.s, self.fingerprints)
+        index = None if cached is None else self.s.index[cached[0]:]
+        #Stateful detectors see every row: update() skips the rows they already absorbed and catches up on cached rows a refit detector has not seen
+        results = self._dispatch(_obs_task, [(i, proc, None if i in _STATEFUL else index) for i, proc in zip(self.method, self.proc)], n_jobs, backend)
+        self.proc = [proc for proc, bounds in results]
+        frames = [bounds for proc, bounds in results]
+        if cached is not None:
+            frames = [new if new is None or i in _STATEFUL else pd.concat([old, new]) for i, old, new in zip(self.method, cached[1], frames)]
+        if cache is not None:
+            cache.save(metric, self.method, self.s, frames, self.fingerprints)
+        self.bounds = [self._keep(bounds) for bounds in frames if bounds is not None]
+
+    @instrument.timed('Anomaly.score_latest')
+    def score_latest(self, timestamp, numerator, denominator=None, weights=None, context=100):
+        """Scores a single new observation against every registered detector without re-validating or re-bounding the history. Each detector sees only a bounded trailing context: rolling and incremental detectors score from their stored state, adtk detectors get the last ``context`` rows (at least one seasonal period) and search the point's bounds without refitting. Detector state is left unchanged, so the observation can still be passed to new_obs later.
+        
+        :param timestamp: Required. Timestamp of the observation.
+        
+        :param float numerator: Required. Numerator of the observation, or its value for univariate metrics.
+        
+        :param float denominator: Default None. Denominator of the observation for ratio metrics.
+        
+        :param list weights: Default None. Weights of the detectors, as in assemble(). Equal weights if None.
+        
+        :param int context: Default 100. Trailing rows of history given to adtk detectors.
+        
+        :returns: one-row DataFrame in the shape of assemble().
+        """
+        if self.series_col is not None:
+            return "score_latest() scores a single series, not one with series_col"
+        timestamp = pd.Timestamp(timestamp)
+        index = pd.DatetimeIndex([timestamp], name=self.s.index.name)
+        n = max([context] + [getattr(proc, 'freq_', None) or 0 for proc in self.proc])
+        history = self.s.iloc[max(self.s.index.searchsorted(timestamp) - n, 0):self.s.index.searchsorted(timestamp)]
+        if self.var_type == 'ratio':
+            row = pd.DataFrame({self.numerator:[numerator], self.denominator:[denominator]}, index=index)
+        else:
+            row = pd.Series([numerator], index=index, name=self.s.name)
+        worker = copy.copy(self)
+        worker.s = pd.concat([history, row])
+        worker.s.index = worker._with_freq(worker.s.index)
+        worker.df = worker.s if self.var_type == 'ratio' else worker.s.to_frame()
+        frames = []
+        for i, proc in zip(self.method, self.proc):
+            if i in _STATEFUL:
+                proc = copy.deepcopy(proc)
+            elif i == 'spc()':
+                proc = copy.copy(proc) #predict() replaces the predicted frame and lookup() extends the limit table; keep both off the fitted chart without copying its baseline
+                proc.table = copy.deepcopy(proc.table)
+            bounds = worker._obs_bounds(i, proc, index=index, refit=False)
+            if bounds is not None:
+                frames.append(bounds)
+        if len(frames) == 1:
+            concatenated = frames[0].copy()
+        else:
+            weights = [1/len(frames)]*len(frames) if weights is None else weights
+            concatenated = utils_ad.weighted_sum([utils_ad.logic_to_numeric(df) for df in frames], weights)
+        concatenated['Median'] = self._medians(concatenated.index)
+        return concatenated
+
+    def _obs_bounds(self, i, proc, index=None, refit=True):
+        #With index, only bounds for those rows are computed and returned; the rest of s is context for the adtk detectors
+        s = self.s if index is None else self.s.loc[index]
+        df = self.df if index is None else self.df.loc[index]
+        if i == 'spc()':
+            proc.predict(s.copy(deep=False))
+            return proc.bounds(predict=True)
+        elif i == 'spc_rolling()':
+            return proc.update(df)
+        elif i == 'ad_quantile_rolling()':
+            if self.var_type == 'ratio':
+                return proc.update(utils_ad.num_den_to_ratio(s,self.numerator,self.denominator))
+            else:
+                return proc.update(s)
+        elif i in ('ad_quantile()', 'ad_seasonal()'):
+            if self.var_type == 'ratio':
+                ratio = utils_ad.num_den_to_ratio(self.s,self.numerator,self.denominator)
+                bounds = ADTK_Bounds(adtk_obj=proc,s=ratio)
+                bounds = bounds.univ_bounds(index=index, search_flagged=False, refit=refit)
+                return bounds if index is None else bounds.loc[index]
             else:
-                print("no other options ¯\_(ツ)_/¯")
+                print("No other var_types built at this time")
+        elif i == 'ad_quantile_sketch()':
+            if self.var_type == 'ratio':
+                return proc.bounds(utils_ad.num_den_to_ratio(s,self.numerator,self.denominator))
+            else:
+                return proc.bounds(s)
+        elif i == 'ad_seasonal_incremental()':
+            if self.var_type == 'ratio':
+                s = utils_ad.num_den_to_ratio(s,self.numerator,self.denominator)
+            proc.update(s)
+            return proc.bounds(s)
+        elif i in ('ad_kmeans_high_dim()', 'ad_regression()', 'ad_pca()'):
+            if self.var_type == 'ratio':
+                bounds = ADTK_Bounds(adtk_obj=proc,s=self.s)
+                bounds = bounds.ratio_bounds(self.numerator,self.denominator,index=index,search_flagged=False,refit=refit)
+                return bounds if index is None else bounds.loc[index]
+            else:
+                print("No other var_types built at this time")
+        elif i == 'ad_regression_incremental()':
+            if self.var_type == 'ratio':
+                proc.update(s)
+                return proc.bounds(s,self.denominator)
+            else:
+                print("No other var_types built at this time")
+        elif i == 'ad_pca_incremental()':
+            if self.var_type == 'ratio':
+                proc.update(s)
+                return proc.bounds(s,self.numerator,self.denominator)
+            else:
+                print("No other var_types built at this time")
+        else:
+            print("no other options ¯\_(ツ)_/¯")
+        return None
+
+
+_worker = None #Anomaly shared by the tasks of a process pool, sent once per worker by _init_worker
+
+def _init_worker(anomaly):
+    global _worker
+    _worker = anomaly
+
+def _fit_task(step, anomaly=None):
+    anomaly = _worker if anomaly is None else anomaly
+    name, kwargs = step
+    return anomaly._fit_one(name, kwargs)
+
+def _series_task(item, anomaly=None):
+    anomaly = _worker if anomaly is None else anomaly
+    return anomaly._series_bounds(*item)
+
+def _obs_task(registered, anomaly=None):
+    anomaly = _worker if anomaly is None else anomaly
+    method, proc, index = registered
+    return proc, anomaly._obs_bounds(method, proc, index=index)
                 
                 
 if __name__ == '__main__':
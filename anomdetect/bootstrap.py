@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def resample(values, stat, n_boot=1000, seed=None, n_jobs=None, chunk_cells=10**7):
+    """Evaluates a statistic on bootstrap resamples of ``values``. Resamples are drawn as one matrix of indices per chunk and ``stat`` is applied to the whole matrix, so there is no Python loop over resamples.
+
+    :param values: Required. 1-D array or Series.
+
+    :param callable stat: Required. Maps a (resamples x len(values)) matrix to one value, or one row of values, per resample, e.g. ``lambda m: m.mean(axis=1)``.
+
+    :param int n_boot: Default 1000. Number of resamples.
+
+    :param int seed: Default None. Seed. Each chunk gets its own stream spawned from it, so results do not depend on n_jobs.
+
+    :param int n_jobs: Default None. Number of threads evaluating chunks at once. numpy releases the GIL in the indexing and reductions, so threads run in parallel. If None, chunks run one after another.
+
+    :param int chunk_cells: Default 10**7. Largest number of matrix cells per chunk, which caps memory at about 80 bytes per cell.
+
+    :returns: numpy array with one entry, or row, per resample.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    size = max(1, chunk_cells//max(n, 1))
+    sizes = [min(size, n_boot - start) for start in range(0, n_boot, size)]
+    streams = np.random.SeedSequence(seed).spawn(len(sizes))
+    def run(chunk):
+        rows, stream = chunk
+        return stat(values[np.random.default_rng(stream).integers(0, n, (rows, n))])
+    if n_jobs is None:
+        parts = [run(chunk) for chunk in zip(sizes, streams)]
+    else:
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            parts = list(pool.map(run, zip(sizes, streams)))
+    return np.concatenate(parts)
+
+def interval(samples, alpha=0.05):
+    """Percentile interval of bootstrap samples.
+
+    :param samples: Required. Array with resamples along the first axis.
+
+    :param float alpha: Default 0.05. 1 - confidence level.
+
+    :returns: tuple of (lower, upper) arrays.
+    """
+    lower, upper = np.nanquantile(samples, [alpha/2, 1-alpha/2], axis=0)
+    return lower, upper
+
+
+if __name__ == '__main__':
+    import time
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=17)
+    begin = time.time()
+    means = resample(values, lambda m: m.mean(axis=1), n_boot=10000, seed=0)
+    print(interval(means), values.mean(), time.time() - begin)
+    print(np.allclose(means, resample(values, lambda m: m.mean(axis=1), n_boot=10000, seed=0, n_jobs=4)))
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from .ingest import from_arrays
+
+
+def fingerprint(detector):
+    """Digest of a detector's parameters and fitted state, used to tell whether cached bounds were computed by the same fit.
+
+    :param detector: Required. Any picklable detector, e.g. an entry of Anomaly.proc.
+
+    :returns: str, hex SHA-1 of the pickled detector.
+    """
+    return hashlib.sha1(pickle.dumps(detector, protocol=4)).hexdigest()
+
+
+class BoundsCache:
+
+    """On-disk cache of the validated series and the bounds of every registered method, one entry per metric and detector recipe. Every column is a separate .npy file, read back memory-mapped, so opening an entry costs nothing until the rows are touched.
+
+    Each entry keeps a SHA-1 digest per block of ``block`` rows of the series it was written with. ``load`` recomputes the digests of the same rows of the current series and discards the entry if any of them changed, i.e. if history was restated; rows appended since are fine and are what the caller still has to compute.
+
+    The recipe only names the methods, so entries also store the ``fingerprint`` of each detector they were written with. ``load`` returns nothing when the current detectors have other parameters or were fit to other data.
+    """
+
+    def __init__(self, root, block=65536):
+        self.root = root
+        self.block = block
+
+    def _path(self, metric, recipe):
+        key = json.dumps([metric, list(recipe)])
+        return os.path.join(self.root, hashlib.sha1(key.encode()).hexdigest()[:16])
+
+    def _digests(self, s, n):
+        frame = s.to_frame() if isinstance(s, pd.Series) else s
+        index = frame.index.asi8
+        values = [frame[c].to_numpy(dtype=float) for c in frame.columns] #float so a different integer downcast does not change the digest
+        digests = []
+        for start in range(0, n, self.block):
+            stop = min(start + self.block, n)
+            h = hashlib.sha1(index[start:stop].tobytes())
+            for v in values:
+                h.update(v[start:stop].tobytes())
+            digests.append(h.hexdigest())
+        return digests
+
+    def save(self, metric, recipe, s, bounds, fingerprints=None):
+        """Writes an entry, replacing any previous one for the same metric and recipe.
+
+        :param str metric: Required. Metric name.
+
+        :param list recipe: Required. Registered methods, e.g. Anomaly.method.
+
+        :param s: Required. Validated series or frame.
+
+        :param list bounds: Required. Bounds DataFrame of each method, aligned to s, or None for methods without bounds.
+
+        :param list fingerprints: Default None. fingerprint() of each detector the bounds were computed with.
+
+        :returns: None.
+        """
+        path = self._path(metric, recipe)
+        tmp = path + '.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        frame = s.to_frame() if isinstance(s, pd.Series) else s
+        np.save(os.path.join(tmp, 'index.npy'), frame.index.asi8)
+        for j, c in enumerate(frame.columns):
+            np.save(os.path.join(tmp, 's%d.npy' % j), frame[c].to_numpy())
+        meta_bounds = []
+        for j, df in enumerate(bounds):
+            if df is None:
+                meta_bounds.append(None)
+                continue
+            for k, c in enumerate(df.columns):
+                np.save(os.path.join(tmp, 'b%d_%d.npy' % (j, k)), df[c].to_numpy(dtype=float))
+            meta_bounds.append({'columns': list(df.columns), 'dtypes': [str(t) for t in df.dtypes]})
+        meta = {'metric': metric, 'recipe': list(recipe), 'rows': len(frame), 'block': self.block,
+                'columns': list(frame.columns), 'squeeze': isinstance(s, pd.Series), 'name': frame.index.name,
+                'digests': self._digests(s, len(frame)), 'bounds': meta_bounds,
+                'fingerprints': None if fingerprints is None else list(fingerprints)}
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+
+    def _meta(self, path):
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _index(self, path):
+        return np.load(os.path.join(path, 'index.npy'), mmap_mode='r').view('datetime64[ns]')
+
+    def history(self, metric, recipe):
+        """Cached validated series, memory-mapped.
+
+        :param str metric: Required. Metric name.
+
+        :param list recipe: Required. Registered methods.
+
+        :returns: DataFrame or Series indexed like the series that was saved, None if there is no entry.
+        """
+        path = self._path(metric, recipe)
+        meta = self._meta(path)
+        if meta is None:
+            return None
+        columns = {c: np.load(os.path.join(path, 's%d.npy' % j), mmap_mode='r') for j, c in enumerate(meta['columns'])}
+        df = from_arrays(self._index(path), date_col=meta['name'], **columns)
+        return df.squeeze(axis=1) if meta['squeeze'] else df
+
+    def load(self, metric, recipe, s, fingerprints=None):
+        """Cached bounds for the leading rows of ``s``, if the entry was written from those same rows.
+
+        :param str metric: Required. Metric name.
+
+        :param list recipe: Required. Registered methods.
+
+        :param s: Required. Current validated series or frame.
+
+        :param list fingerprints: Default None. fingerprint() of each current detector. Must match the ones the entry was saved with.
+
+        :returns: tuple of (number of cached rows, list of memory-mapped bounds DataFrames or None per method), or None if there is no valid entry. An entry whose rows changed is deleted.
+        """
+        path = self._path(metric, recipe)
+        meta = self._meta(path)
+        if meta is None or meta['recipe'] != list(recipe):
+            return None
+        if meta.get('fingerprints') != (None if fingerprints is None else list(fingerprints)):
+            return None #Same methods, different parameters or fit; the next save replaces the entry
+        n = meta['rows']
+        if len(s) < n or meta['block'] != self.block or self._digests(s, n) != meta['digests']:
+            self.invalidate(metric, recipe)
+            return None
+        index = s.index[:n]
+        bounds = []
+        for j, b in enumerate(meta['bounds']):
+            if b is None:
+                bounds.append(None)
+                continue
+            columns = {c: np.load(os.path.join(path, 'b%d_%d.npy' % (j, k)), mmap_mode='r') for k, c in enumerate(b['columns'])}
+            df = pd.DataFrame(columns, index=index, copy=False)
+            for c, t in zip(b['columns'], b['dtypes']):
+                if t != 'float64':
+                    df[c] = df[c].astype(t)
+            bounds.append(df)
+        return n, bounds
+
+    def invalidate(self, metric, recipe):
+        """Deletes the entry for a metric and recipe, if any.
+
+        :returns: None.
+        """
+        shutil.rmtree(self._path(metric, recipe), ignore_errors=True)
+
+
+if __name__ == '__main__':
+    import tempfile
+    idx = pd.date_range("2021-01-01", periods=100, freq="H", name="Date")
+    s = pd.DataFrame({"Numerator":np.arange(100), "Denominator":np.arange(100)+50}, index=idx)
+    bounds = pd.DataFrame({"Values":s.Numerator/s.Denominator, "UCL":1.0, "LCL":0.0, "Violation":0.0}, index=idx)
+    cache = BoundsCache(tempfile.mkdtemp(), block=16)
+    cache.save("hdvch", ["spc()"], s.iloc[:80], [bounds.iloc[:80]])
+    n, cached = cache.load("hdvch", ["spc()"], s)
+    print(n, cached[0].tail(2), cache.history("hdvch", ["spc()"]).index.freq)
+    s.iloc[3, 0] = 999
+    print(cache.load("hdvch", ["spc()"], s))
+
+    #A refit detector reusing the entry must give the same bounds as one run without a cache, stateful ones included
+    from .anomaly import Anomaly
+    rng = np.random.default_rng(0)
+    den = rng.integers(100, 200, 100)
+    p = np.where(np.arange(100) < 60, 0.1, 0.3) #Level shift after the baseline
+    df = pd.DataFrame({"Numerator":rng.binomial(den, p), "Denominator":den}, index=idx)
+    def refit():
+        ad_df = Anomaly(df.iloc[:50], var_type="ratio", numerator="Numerator", denominator="Denominator")
+        ad_df.validate("Date")
+        ad_df.ad_quantile(window=10, test=False)
+        ad_df.spc("p", test=False)
+        return ad_df
+    cache = BoundsCache(tempfile.mkdtemp(), block=16)
+    refit().new_obs(df.iloc[:80], cache=cache, metric="hdvch")
+    cached = refit()
+    cached.new_obs(df, cache=cache, metric="hdvch")
+    uncached = refit()
+    uncached.new_obs(df)
+    assert all(a.equals(b) for a, b in zip(cached.bounds_frames(), uncached.bounds_frames()))
+    print(cached.bounds_frames()[0].UCL.iloc[-1], uncached.bounds_frames()[0].UCL.iloc[-1])
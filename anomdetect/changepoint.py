@@ -0,0 +1,98 @@
+import numpy as np
+
+
+def _noise(x, w):
+    #Robust noise scale from first differences, so level shifts barely move it. Var(x[i+1]-x[i]) = sigma^2*(1/w[i]+1/w[i+1])
+    d = np.diff(x)*np.sqrt(w[1:]*w[:-1]/(w[1:]+w[:-1]))
+    d = d[np.isfinite(d)]
+    if len(d) == 0:
+        return 1.0
+    sigma = np.median(np.abs(d))/0.6745
+    if sigma == 0:
+        sigma = np.std(d)
+    return sigma if sigma > 0 else 1.0
+
+def pelt(values, weights=None, penalty=None, min_size=5):
+    """Changepoints in the mean of a series, found with PELT (Killick, Fearnhead and Eckley, 2012). Segment costs are weighted squared deviations from the segment mean, read off cumulative sums in constant time, and candidates that can no longer start the last segment are pruned, so the expected cost is linear in the length of the series.
+
+    :param values: Required. 1-D array or Series, e.g. a ratio series.
+
+    :param weights: Default None. Weight of each observation, e.g. the denominators of a ratio series, whose variance is inversely proportional to them. Equal weights if None.
+
+    :param float penalty: Default None. Cost of adding a changepoint, in units of the noise variance. 2*log(n) if None.
+
+    :param int min_size: Default 5. Minimum segment length.
+
+    :returns: list of positions where a new segment starts, in increasing order. Empty if the series is one segment.
+    """
+    x = np.asarray(values, dtype=float)
+    n = len(x)
+    w = np.ones(n) if weights is None else np.asarray(weights, dtype=float)
+    missing = ~np.isfinite(x) | ~np.isfinite(w) | (w <= 0)
+    x = np.where(missing, 0.0, x)
+    w = np.where(missing, 0.0, w)
+    if n < 2*min_size:
+        return []
+    present = ~missing
+    scale = _noise(x[present], w[present])**2
+    if penalty is None:
+        penalty = 2*np.log(n)
+    W = np.concatenate(([0.0], np.cumsum(w)))
+    WX = np.concatenate(([0.0], np.cumsum(w*x)))
+    WXX = np.concatenate(([0.0], np.cumsum(w*x*x)))
+    def cost(s, t):
+        sw = W[t] - W[s]
+        swx = WX[t] - WX[s]
+        fit = np.divide(swx*swx, sw, out=np.zeros_like(sw), where=sw > 0)
+        return (WXX[t] - WXX[s] - fit)/scale
+    F = np.empty(n+1)
+    F[0] = -penalty
+    last = np.zeros(n+1, dtype=int)
+    candidates = np.array([0])
+    for t in range(min_size, n+1):
+        total = F[candidates] + cost(candidates, t) + penalty
+        best = np.argmin(total)
+        F[t] = total[best]
+        last[t] = candidates[best]
+        candidates = candidates[total - penalty <= F[t]] #Pruning: these can never beat t as the start of a later segment
+        if t - min_size + 1 >= min_size:
+            candidates = np.append(candidates, t - min_size + 1)
+    changepoints = []
+    t = n
+    while t > 0:
+        t = last[t]
+        if t > 0:
+            changepoints.append(t)
+    return changepoints[::-1]
+
+def stable_start(values, weights=None, penalty=None, min_size=5, min_length=20):
+    """Position where the most recent stable segment of a series starts, i.e. the last changepoint found by pelt() that leaves at least ``min_length`` rows after it. A short final segment, such as one spike near the end, is merged into the segment before it instead of becoming the whole baseline.
+
+    :param values: Required. 1-D array or Series.
+
+    :param weights: Default None. Passed to pelt().
+
+    :param float penalty: Default None. Passed to pelt().
+
+    :param int min_size: Default 5. Passed to pelt().
+
+    :param int min_length: Default 20. Minimum number of rows kept, capped at the length of the series.
+
+    :returns: int, 0 if the whole series is one segment or no changepoint leaves min_length rows.
+    """
+    n = len(values)
+    changepoints = [c for c in pelt(values, weights, penalty, min_size) if n - c >= min_length]
+    return changepoints[-1] if changepoints else 0
+
+
+if __name__ == '__main__':
+    import time
+    rng = np.random.default_rng(0)
+    den = rng.integers(100, 500, 2000)
+    p = np.repeat([0.10, 0.14, 0.10, 0.07], [600, 500, 500, 400])
+    values = rng.binomial(den, p)/den
+    print(pelt(values, den), stable_start(values))
+    begin = time.time()
+    for i in range(100):
+        pelt(values, den)
+    print((time.time() - begin)/100)
@@ -0,0 +1,157 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def _downcast(col, dtype=None):
+    if dtype is not None:
+        return col.astype(dtype, copy=False)
+    if pd.api.types.is_integer_dtype(col.dtype):
+        return pd.to_numeric(col, downcast='integer')
+    if pd.api.types.is_float_dtype(col.dtype) and not col.isna().any() and (col % 1 == 0).all():
+        return pd.to_numeric(col, downcast='integer')
+    return col
+
+def _prepare_chunk(chunk, date_col, columns, date_format, dtype):
+    index = pd.DatetimeIndex(pd.to_datetime(chunk[date_col], format=date_format), name=date_col)
+    out = {}
+    for c in columns:
+        out[c] = _downcast(chunk[c], dtype.get(c)).to_numpy()
+    return pd.DataFrame(out, index=index, copy=False)
+
+def _csv_chunks(path, date_col, columns, chunksize):
+    return pd.read_csv(path, usecols=[date_col]+columns, chunksize=chunksize,
+                       dtype={date_col: str})
+
+def _parquet_chunks(path, date_col, columns, chunksize):
+    import pyarrow.parquet as pq #Only needed for parquet input
+    f = pq.ParquetFile(path)
+    for batch in f.iter_batches(batch_size=chunksize, columns=[date_col]+columns):
+        yield batch.to_pandas()
+
+def read_chunks(path, date_col, columns, date_format=None, dtype=None, chunksize=100000):
+    """Reads a CSV or Parquet file chunk by chunk, yielding date-indexed frames with downcast numeric columns.
+
+    :param str path: Required. Path to a .csv or .parquet file.
+
+    :param str date_col: Required. Name of Date column in the file.
+
+    :param list columns: Required. Value columns to keep, e.g. [numerator, denominator].
+
+    :param str date_format: Default None. strftime format of date_col, e.g. "%Y-%m-%d". Giving it skips format inference on every chunk.
+
+    :param dict dtype: Default None. Explicit dtype per column. Columns not listed are downcast to the smallest integer type that holds them, floats with fractions are left alone.
+
+    :param int chunksize: Default 100000. Rows per chunk.
+
+    :returns: generator of DataFrames.
+    """
+    dtype = {} if dtype is None else dtype
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.parquet', '.pq'):
+        chunks = _parquet_chunks(path, date_col, columns, chunksize)
+    else:
+        chunks = _csv_chunks(path, date_col, columns, chunksize)
+    for chunk in chunks:
+        yield _prepare_chunk(chunk, date_col, columns, date_format, dtype)
+
+def read_validated(path, date_col, columns, date_format=None, dtype=None, chunksize=100000):
+    """Builds a validated, date-indexed frame from a CSV or Parquet file without materializing the raw file. The checks adtk's ``validate_series`` makes are applied once at the end: duplicated timestamps keep their first value, the index is sorted if it is not already, and a regular frequency is attached to the index.
+
+    The result can be passed straight to ``Anomaly``; ``Anomaly.validate`` recognizes that it is already indexed by date_col.
+
+    :param str path: Required. Path to a .csv or .parquet file.
+
+    :param str date_col: Required. Name of Date column in the file.
+
+    :param list columns: Required. Value columns to keep, e.g. [numerator, denominator].
+
+    :param str date_format: Default None. strftime format of date_col.
+
+    :param dict dtype: Default None. Explicit dtype per column.
+
+    :param int chunksize: Default 100000. Rows per chunk.
+
+    :returns: DataFrame indexed by date_col.
+    """
+    parts = list(read_chunks(path, date_col, columns, date_format, dtype, chunksize))
+    if len(parts) == 0:
+        return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name=date_col))
+    df = pd.concat(parts, copy=False) if len(parts) > 1 else parts[0]
+    del parts
+    return _finish(df)
+
+def _finish(df):
+    dup = df.index.duplicated(keep="first")
+    if dup.any():
+        df = df[~dup]
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    if df.index.freq is None and len(df) > 2:
+        freq = df.index.inferred_freq
+        if freq is not None:
+            df.index = pd.DatetimeIndex(df.index, freq=freq)
+    return df
+
+def from_arrays(dates, date_col="Date", **columns):
+    """Wraps NumPy arrays in a validated, date-indexed frame. Arrays of datetime64[ns] dates and numeric values are used as they are, without copying; other date types are converted once.
+
+    The result can be passed straight to ``Anomaly``; ``Anomaly.validate`` recognizes that it is already indexed by date_col.
+
+    :param dates: Required. Array of timestamps.
+
+    :param str date_col: Default "Date". Name given to the index.
+
+    :param columns: Required. Value columns as keyword arguments, e.g. Numerator=num, Denominator=den.
+
+    :returns: DataFrame indexed by date_col.
+    """
+    index = pd.DatetimeIndex(dates, name=date_col)
+    df = pd.DataFrame({c: np.asarray(v) for c, v in columns.items()}, index=index, copy=False)
+    return _finish(df)
+
+def _arrow_numpy(col):
+    chunks = getattr(col, 'chunks', [col]) #Table columns are chunked, RecordBatch columns are not
+    if len(chunks) == 1 and col.null_count == 0:
+        try:
+            return chunks[0].to_numpy(zero_copy_only=True)
+        except Exception:
+            pass #Type has no zero-copy NumPy equivalent
+    return col.to_pandas().to_numpy()
+
+def from_arrow(table, date_col, columns=None):
+    """Wraps an Arrow table or record batch in a validated, date-indexed frame. Single-chunk columns without nulls whose type maps onto NumPy (integers, floats, timestamp[ns]) are wrapped without copying and stay read-only views of the Arrow buffers; other columns are converted once.
+
+    The result can be passed straight to ``Anomaly``; ``Anomaly.validate`` recognizes that it is already indexed by date_col.
+
+    :param table: Required. pyarrow Table or RecordBatch.
+
+    :param str date_col: Required. Name of Date column in the table.
+
+    :param list columns: Default None. Value columns to keep. Every column other than date_col if None.
+
+    :returns: DataFrame indexed by date_col.
+    """
+    if columns is None:
+        columns = [c for c in table.schema.names if c != date_col]
+    dates = _arrow_numpy(table.column(date_col))
+    if not np.issubdtype(dates.dtype, np.datetime64):
+        dates = pd.to_datetime(dates)
+    return from_arrays(dates, date_col=date_col, **{c: _arrow_numpy(table.column(c)) for c in columns})
+
+
+if __name__ == '__main__':
+    import tempfile
+    d = pd.date_range("2019-09-30", periods=17).strftime("%Y-%m-%d")
+    num = [10,40,30,20,10,50,60,50,40,30,20,60,50,40,30,20,40]
+    den = [110,430,290,210,120,510,590,530,410,310,190,650,510,420,310,220,421]
+    path = os.path.join(tempfile.mkdtemp(), "hdvch.csv")
+    pd.DataFrame({"Numerator":num, "Denominator":den, "Date":d}).to_csv(path, index=False)
+    df = read_validated(path, "Date", ["Numerator","Denominator"], date_format="%Y-%m-%d", chunksize=5)
+    print(df.dtypes)
+    print(df.index)
+    import pyarrow as pa
+    table = pa.table({"Date":pd.to_datetime(d), "Numerator":num, "Denominator":den})
+    df = from_arrow(table, "Date")
+    print(np.shares_memory(df["Numerator"].to_numpy(), table.column("Numerator").chunks[0].to_numpy()))
@@ -0,0 +1,185 @@
+"""Opt-in timers, counters and memory high-water marks for the hot paths of anomdetect.
+
+Everything is off by default. While disabled, ``stage`` hands back a shared no-op context, ``timed`` calls straight through and ``count`` returns on its first line, so the cost is one global lookup per call site.
+
+Typical use::
+
+    from anomdetect import instrument
+    instrument.enable(memory=True)
+    instrument.add_hook(lambda kind, name, value: statsd.gauge(kind + '.' + name, value))
+    ad.new_obs(df)
+    print(instrument.summary())
+"""
+
+import functools
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+import pandas as pd
+
+_enabled = False
+_memory = False
+_hooks = []
+_mem_stack = [] #[start bytes, highest peak seen before a nested stage reset it]
+_mem_thread = None #Thread that called enable(memory=True), the only one whose stages take memory marks
+_NULL = nullcontext()
+
+_calls = {}
+_seconds = {}
+_peaks = {}
+_counts = {}
+
+def enable(memory=False):
+    """Turns instrumentation on.
+
+    :param bool memory: Default False. Also track per-stage memory high-water marks with tracemalloc. This slows allocation-heavy code noticeably, so leave it off unless memory is what is being investigated. tracemalloc keeps a single peak for the whole process, so marks are only taken by stages in the thread that called enable. Stages run in other threads, e.g. the thread pools of fit_all and new_obs, are timed but get no memory mark; their allocations still count towards the peak of the enclosing stage of the calling thread.
+
+    :returns: None.
+    """
+    global _enabled, _memory, _mem_thread
+    _enabled = True
+    _memory = memory
+    _mem_thread = threading.get_ident()
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def disable():
+    """Turns instrumentation off. Collected numbers are kept until ``reset``.
+
+    :returns: None.
+    """
+    global _enabled, _memory
+    _enabled = False
+    if _memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _memory = False
+    del _mem_stack[:]
+
+def reset():
+    """Clears all collected timings, counters and memory marks.
+
+    :returns: None.
+    """
+    _calls.clear()
+    _seconds.clear()
+    _peaks.clear()
+    _counts.clear()
+
+def add_hook(hook):
+    """Registers a callable that receives every measurement as it is taken, e.g. to forward it to a metrics system.
+
+    :param callable hook: Required. Called as ``hook(kind, name, value)`` where kind is "time" (seconds), "count" (increment) or "memory" (bytes).
+
+    :returns: None.
+    """
+    _hooks.append(hook)
+
+def remove_hook(hook):
+    """Unregisters a hook added with ``add_hook``.
+
+    :returns: None.
+    """
+    _hooks.remove(hook)
+
+def _emit(kind, name, value):
+    for hook in _hooks:
+        hook(kind, name, value)
+
+def count(name, n=1):
+    """Increments a named counter, e.g. "predict" or "deepcopy".
+
+    :param str name: Required. Counter name.
+
+    :param int n: Default 1. Increment.
+
+    :returns: None.
+    """
+    if not _enabled:
+        return
+    _counts[name] = _counts.get(name, 0) + n
+    if _hooks:
+        _emit("count", name, n)
+
+
+class _Stage:
+
+    def __init__(self, name):
+        self._name = name
+
+    def __enter__(self):
+        self._memory = _memory and threading.get_ident() == _mem_thread
+        if self._memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if _mem_stack:
+                _mem_stack[-1][1] = max(_mem_stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            _mem_stack.append([current, 0])
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._start
+        name = self._name
+        _calls[name] = _calls.get(name, 0) + 1
+        _seconds[name] = _seconds.get(name, 0.0) + elapsed
+        if _hooks:
+            _emit("time", name, elapsed)
+        if self._memory and _mem_stack:
+            current, peak = tracemalloc.get_traced_memory()
+            start, nested = _mem_stack.pop()
+            high = max(peak, nested)
+            if _mem_stack:
+                _mem_stack[-1][1] = max(_mem_stack[-1][1], high)
+            used = high - start
+            if used > _peaks.get(name, 0):
+                _peaks[name] = used
+            if _hooks:
+                _emit("memory", name, used)
+        return False
+
+def stage(name):
+    """Times a block of code as a named stage.
+
+    :param str name: Required. Stage name, e.g. "validate" or "fit_detect".
+
+    :returns: context manager.
+    """
+    if not _enabled:
+        return _NULL
+    return _Stage(name)
+
+def timed(name):
+    """Decorator form of ``stage``.
+
+    :param str name: Required. Stage name.
+
+    :returns: decorator.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def summary():
+    """Collected measurements so far.
+
+    :returns: DataFrame indexed by stage or counter name with the following columns:
+        * calls
+        * seconds
+        * peak_bytes
+        * count
+    """
+    names = sorted(set(_calls) | set(_counts))
+    out = pd.DataFrame(index=pd.Index(names, name='name'))
+    out['calls'] = [_calls.get(n, 0) for n in names]
+    out['seconds'] = [_seconds.get(n, 0.0) for n in names]
+    out['peak_bytes'] = [_peaks.get(n, float('nan')) for n in names]
+    out['count'] = [_counts.get(n, 0) for n in names]
+    return out
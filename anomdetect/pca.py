@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+from sklearn.decomposition import IncrementalPCA
+
+from .sketch import KLLSketch
+
+
+class IncrementalPcaAD:
+
+    """PCA reconstruction-error detector that is fit from chunks and updated with new batches. It follows adtk's ``PcaAD``: every time point is projected onto the first k principal components, and it is anomalous when its squared reconstruction error is outside [Q1 - c*IQR, Q3 + c*IQR] of historical errors.
+
+    The components come from ``sklearn.decomposition.IncrementalPCA`` and the error quartiles from a KLLSketch, so neither the frame nor the error history has to be held in memory at once. Errors absorbed by ``update`` are measured against the components as they stood when the batch arrived.
+    """
+
+    def __init__(self, k=1, c=5.0, chunksize=10000, sketch_k=200):
+        self.k = k
+        self.c = c
+        self.chunksize = chunksize
+        self._sketch_k = sketch_k
+        self._model = None
+        self._errors = None
+        self._pending = None #Rows held back until there are at least k of them
+        self._last = None
+
+    def _chunks(self, df):
+        for start in range(0, len(df), self.chunksize):
+            yield df.iloc[start:start+self.chunksize]
+
+    def _errors_of(self, values):
+        reconstructed = self._model.inverse_transform(self._model.transform(values))
+        return ((reconstructed - values)**2).sum(axis=1)
+
+    def _absorb(self, chunk):
+        values = chunk.dropna().to_numpy(dtype=float)
+        if self._pending is not None:
+            values = np.vstack([self._pending, values])
+            self._pending = None
+        if len(values) < self.k:
+            self._pending = values
+            return values[:0]
+        self._model.partial_fit(values)
+        return values
+
+    def fit(self, s):
+        """Fits the components and error quartiles from scratch.
+
+        :param s: Required. DataFrame, or an iterable of DataFrame chunks for data that does not fit in memory. A DataFrame is read twice, once to fit the components and once to score errors against the final components; an iterable is read once.
+
+        :returns: None.
+        """
+        self._model = IncrementalPCA(n_components=self.k)
+        self._errors = KLLSketch(k=self._sketch_k)
+        self._pending = None
+        if isinstance(s, pd.DataFrame):
+            for chunk in self._chunks(s):
+                self._absorb(chunk)
+            for chunk in self._chunks(s.dropna()):
+                self._errors.update(self._errors_of(chunk.to_numpy(dtype=float)))
+            self._last = s.index[-1]
+        else:
+            for chunk in s:
+                values = self._absorb(chunk)
+                if len(values) > 0:
+                    self._errors.update(self._errors_of(values))
+                self._last = chunk.index[-1]
+
+    def update(self, s):
+        """Updates the components and error quartiles with the rows of ``s`` newer than the last one seen. Earlier rows are ignored, so the full history can be passed each time.
+
+        :param DataFrame s: Required. Validated multivariate series.
+
+        :returns: None.
+        """
+        new = s[s.index > self._last]
+        if len(new) == 0:
+            return
+        for chunk in self._chunks(new):
+            values = self._absorb(chunk)
+            if len(values) > 0:
+                self._errors.update(self._errors_of(values))
+        self._last = new.index[-1]
+
+    def thresholds(self):
+        """Current limits on the squared reconstruction error.
+
+        :returns: tuple of (upper, lower).
+        """
+        q1 = self._errors.quantile(0.25)
+        q3 = self._errors.quantile(0.75)
+        iqr = q3 - q1
+        return q3 + self.c*iqr, q1 - self.c*iqr
+
+    def predict(self, s):
+        """Flags time points whose reconstruction error is outside the historical range.
+
+        :param DataFrame s: Required. Validated multivariate series.
+
+        :returns: Series of booleans, NaN for rows with missing values.
+        """
+        upper, lower = self.thresholds()
+        valid = s.notna().all(axis=1).to_numpy()
+        predicted = pd.Series(np.nan, index=s.index, dtype=object)
+        if valid.any():
+            errors = self._errors_of(s[valid].to_numpy(dtype=float))
+            predicted[valid] = (errors > upper) | (errors < lower)
+        return predicted
+
+    def fit_detect(self, s):
+        """Fits on ``s`` and flags its anomalies.
+
+        :param DataFrame s: Required. Validated multivariate series.
+
+        :returns: Series of booleans, NaN for rows with missing values.
+        """
+        self.fit(s)
+        return self.predict(s)
+
+    def bounds(self, s, numerator, denominator):
+        """Calculates bounds in the same shape as ``ADTK_Bounds.ratio_bounds``. With the other columns held fixed, the squared reconstruction error is a quadratic in the numerator, so the numerator values where it crosses the upper threshold are solved for directly instead of stepped towards. Unlike ``ratio_bounds``, flagged points are not refit with the point replaced by the median ratio.
+
+        :param DataFrame s: Required. Validated multivariate series.
+
+        :param str numerator: Required. Numerator column of ``s``.
+
+        :param str denominator: Required. Denominator column of ``s``.
+
+        :returns: Pandas DataFrame with ratio bound violations.
+        """
+        upper, lower = self.thresholds()
+        values = s.to_numpy(dtype=float)
+        j = s.columns.get_loc(numerator)
+        components = self._model.components_
+        centered = values - self._model.mean_
+        residual = centered - (centered @ components.T) @ components
+        step = -components.T @ components[:, j] #Change in residual per unit of numerator
+        step[j] += 1
+        a = step @ step
+        b = 2*(residual @ step)
+        c = (residual**2).sum(axis=1) - upper
+        with np.errstate(invalid='ignore', divide='ignore'):
+            root = np.sqrt(b**2 - 4*a*c)
+            high = (-b + root)/(2*a)
+            low = (-b - root)/(2*a)
+        if a == 0:
+            high = np.full(len(s), np.inf) #The numerator lies in the span of the components, so it never moves the error
+            low = np.full(len(s), -np.inf)
+        num = values[:, j]
+        den = values[:, s.columns.get_loc(denominator)]
+        out = pd.DataFrame(index=s.index)
+        out['Values'] = num/den
+        out['UCL'] = (num + high)/den
+        out['LCL'] = (num + low)/den
+        out['Violation'] = self.predict(s).astype(float).to_numpy()
+        return out
+
+
+if __name__ == '__main__':
+    import adtk.detector as ad
+    rng = np.random.default_rng(0)
+    idx = pd.date_range("2021-01-01", periods=5000, freq="H")
+    den = rng.integers(100, 200, len(idx))
+    df = pd.DataFrame({"Numerator":rng.binomial(den, 0.1), "Denominator":den}, index=idx)
+    df.iloc[100, 0] = 80
+    pca_ad = IncrementalPcaAD(k=1, chunksize=500)
+    pca_ad.fit(df.iloc[:4000])
+    pca_ad.update(df)
+    print(pca_ad.predict(df).astype(float).sum(), ad.PcaAD(k=1).fit_detect(df).sum())
+    print(pca_ad.bounds(df, "Numerator", "Denominator").iloc[98:102])
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+
+def _lttb(x, y, n_out):
+    #Largest-Triangle-Three-Buckets (Steinarsson, 2013): keeps the point of each bucket that spans the largest triangle with the point kept before it and the mean of the next bucket
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n-1, n_out-1).astype(int)
+    keep = np.empty(n_out, dtype=int)
+    keep[0] = 0
+    keep[-1] = n-1
+    a = 0
+    for b in range(n_out-2):
+        lo, hi = edges[b], edges[b+1]
+        nxt = slice(edges[b+1], edges[b+2] if b+2 < len(edges) else n)
+        cx = x[nxt].mean()
+        cy = np.nanmean(y[nxt]) if np.isfinite(y[nxt]).any() else y[a]
+        area = np.abs((x[a]-cx)*(y[lo:hi]-y[a]) - (x[a]-x[lo:hi])*(cy-y[a]))
+        area = np.where(np.isnan(area), -1, area)
+        a = lo + int(np.argmax(area))
+        keep[b+1] = a
+    return keep
+
+def _jumps(v, jump, n_buckets):
+    #Discontinuities of v, at most the largest one per bucket so bounds that change on every row cannot flood the output
+    change = np.abs(np.diff(v))
+    finite = change[np.isfinite(change)]
+    tol = jump*np.median(finite) if len(finite) else 0
+    nan_edge = np.isnan(v[1:]) != np.isnan(v[:-1])
+    steps = np.flatnonzero((change > tol) | nan_edge)
+    if len(steps) == 0:
+        return steps
+    size = np.where(nan_edge[steps], np.inf, change[steps])
+    bucket = steps*n_buckets//len(change)
+    order = np.lexsort((-size, bucket))
+    first = np.r_[True, bucket[order][1:] != bucket[order][:-1]]
+    return np.sort(steps[order][first]) + 1
+
+def downsample(bounds, max_points=2000, jump=3.0):
+    """Reduces a bounds frame to about max_points rows for drawing. Values are downsampled with Largest-Triangle-Three-Buckets, which keeps the visual shape of the line. Violations are always kept, even beyond max_points. Bound discontinuities are kept with the row before them, at most the largest one of UCL and of LCL in each of max_points equal slices of the rows, so the output has at most 5*max_points rows plus the violations.
+
+    :param DataFrame bounds: Required. Output of Anomaly.assemble(), SPC.bounds() or any bounds frame with Values, UCL, LCL and Violation columns.
+
+    :param int max_points: Default 2000. Number of rows Values is downsampled to.
+
+    :param float jump: Default 3.0. A change in UCL or LCL counts as a discontinuity when it is larger than jump times the median change. Piecewise constant bounds have a median change of 0, so every step counts.
+
+    :returns: DataFrame with a subset of the rows of bounds.
+    """
+    n = len(bounds)
+    if n <= max_points:
+        return bounds
+    x = np.arange(n, dtype=float)
+    keep = [_lttb(x, bounds['Values'].to_numpy(dtype=float), max_points)]
+    if 'Violation' in bounds:
+        keep.append(np.flatnonzero(bounds['Violation'].to_numpy(dtype=float) > 0))
+    for col in ('UCL', 'LCL'):
+        if col in bounds:
+            steps = _jumps(bounds[col].to_numpy(dtype=float), jump, max_points)
+            keep += [steps, steps - 1]
+    return bounds.iloc[np.unique(np.concatenate(keep))]
+
+def plot_bounds(bounds, max_points=2000, ax=None, title=None):
+    """Draws Values with their UCL and LCL, marking violations, after downsampling so drawing time does not grow with the length of the series.
+
+    :param DataFrame bounds: Required. Output of Anomaly.assemble(), SPC.bounds() or any bounds frame with Values, UCL, LCL and Violation columns.
+
+    :param int max_points: Default 2000. Passed to downsample().
+
+    :param ax: Default None. Matplotlib axes to draw on. A new figure is made if None.
+
+    :param str title: Default None. Axes title.
+
+    :returns: Matplotlib axes.
+    """
+    df = downsample(bounds, max_points)
+    if ax is None:
+        fig, ax = plt.subplots(figsize=(12, 4))
+    ax.plot(df.index, df['Values'], color='tab:blue', linewidth=0.8, label='Values')
+    ax.plot(df.index, df['UCL'], color='tab:gray', linewidth=0.8, drawstyle='steps-post', label='UCL')
+    ax.plot(df.index, df['LCL'], color='tab:gray', linewidth=0.8, drawstyle='steps-post', label='LCL')
+    if 'Median' in df:
+        ax.plot(df.index, df['Median'], color='tab:green', linewidth=0.8, linestyle='--', label='Median')
+    if 'Violation' in df:
+        flagged = df[df['Violation'] > 0]
+        ax.scatter(flagged.index, flagged['Values'], color='tab:red', s=12, zorder=3, label='Violation')
+    if title is not None:
+        ax.set_title(title)
+    ax.legend(loc='upper left')
+    return ax
+
+
+if __name__ == '__main__':
+    import time
+    import matplotlib
+    matplotlib.use('Agg')
+    rng = np.random.default_rng(0)
+    idx = pd.date_range("2019-01-01", periods=60*24*365, freq="T")
+    values = 0.1 + 0.01*np.sin(np.arange(len(idx))*2*np.pi/1440) + rng.normal(scale=0.002, size=len(idx))
+    ucl = np.where(idx < "2019-07-01", 0.13, 0.125)
+    values[rng.integers(0, len(idx), 20)] += 0.05
+    bounds = pd.DataFrame({"Values":values, "UCL":ucl, "LCL":0.07}, index=idx)
+    bounds['Violation'] = ((bounds.Values > bounds.UCL) | (bounds.Values < bounds.LCL)).astype(float)
+    begin = time.time()
+    small = downsample(bounds)
+    plot_bounds(bounds).figure.savefig("/tmp/bounds.png")
+    print(len(bounds), len(small), int(bounds.Violation.sum()), time.time() - begin)
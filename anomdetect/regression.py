@@ -0,0 +1,174 @@
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from .sketch import KLLSketch
+from .rolling import RollingQuantile
+
+
+class SufficientStatsRegressionAD:
+
+    """Regression detector that is refit from sufficient statistics instead of the full history. It follows adtk's ``RegressionAD`` with a linear regressor: the target column is regressed on every other column plus an intercept, and a point is anomalous when its absolute residual is beyond Q3 + c*IQR of historical absolute residuals.
+
+    Only the cross products XᵀX and Xᵀy are stored, so absorbing new rows costs O(new rows * features²) and the coefficients are re-solved from a (features+1)² system. Absolute residuals go into a KLLSketch or, with a window, into a RollingQuantile of the same length. With a window the rows that drop out are subtracted from the cross products, so the fit always covers the last ``window`` complete rows. Residuals of updated rows are taken against the coefficients as they stood when the batch arrived.
+    """
+
+    def __init__(self, target, c=3.0, side="both", window=None, k=200):
+        if side not in ("both", "positive", "negative"):
+            raise ValueError("Parameter `side` must be 'both', 'positive' or 'negative'.")
+        self.target = target
+        self.c = c
+        self.side = side
+        self.window = window
+        self._k = k
+        self.coef_ = None #Intercept followed by one coefficient per feature column
+        self._xtx = None
+        self._xty = None
+        self._rows = None
+        self._residuals = None
+        self._last = None
+
+    def _design(self, s):
+        X = np.column_stack([np.ones(len(s)), s.drop(columns=self.target).to_numpy(dtype=float)])
+        y = s[self.target].to_numpy(dtype=float)
+        valid = ~(np.isnan(X).any(axis=1) | np.isnan(y))
+        return X, y, valid
+
+    def _solve(self):
+        self.coef_ = np.linalg.lstsq(self._xtx, self._xty, rcond=None)[0]
+
+    def _absorb(self, X, y):
+        self._xtx += X.T @ X
+        self._xty += X.T @ y
+        if self.window is not None:
+            self._rows.extend(zip(X, y))
+            n = len(self._rows) - self.window
+            if n > 0:
+                old = [self._rows.popleft() for i in range(n)]
+                old_X = np.array([row[0] for row in old])
+                old_y = np.array([row[1] for row in old])
+                self._xtx -= old_X.T @ old_X
+                self._xty -= old_X.T @ old_y
+        self._solve()
+
+    def _add_residuals(self, residual):
+        if self.window is None:
+            self._residuals.update(np.abs(residual))
+        else:
+            for r in np.abs(residual):
+                self._residuals._push(r)
+
+    def fit(self, s):
+        """Fits the coefficients and residual quantiles from scratch.
+
+        :param DataFrame s: Required. Validated multivariate series including the target column.
+
+        :returns: None.
+        """
+        X, y, valid = self._design(s)
+        X, y = X[valid], y[valid]
+        if self.window is not None:
+            X, y = X[-self.window:], y[-self.window:]
+        self._xtx = X.T @ X
+        self._xty = X.T @ y
+        self._rows = deque(zip(X, y)) if self.window is not None else None
+        self._residuals = KLLSketch(k=self._k) if self.window is None else RollingQuantile(self.window, None, None)
+        self._solve()
+        self._add_residuals(y - X @ self.coef_)
+        self._last = s.index[-1]
+
+    def update(self, s):
+        """Absorbs the rows of ``s`` newer than the last one seen and re-solves the coefficients. Earlier rows are ignored, so the full history can be passed each time.
+
+        :param DataFrame s: Required. Validated multivariate series including the target column.
+
+        :returns: None.
+        """
+        new = s[s.index > self._last]
+        if len(new) == 0:
+            return
+        X, y, valid = self._design(new)
+        X, y = X[valid], y[valid]
+        if len(y) > 0:
+            self._add_residuals(y - X @ self.coef_)
+            self._absorb(X, y)
+        self._last = new.index[-1]
+
+    def threshold(self):
+        """Largest absolute residual that is not anomalous.
+
+        :returns: float.
+        """
+        q1 = self._residuals.quantile(0.25)
+        q3 = self._residuals.quantile(0.75)
+        return q3 + self.c*(q3 - q1)
+
+    def _limits(self, s):
+        X, y, valid = self._design(s)
+        expected = X @ self.coef_
+        threshold = self.threshold()
+        upper = expected + threshold if self.side in ("both", "positive") else np.full(len(s), np.inf)
+        lower = expected - threshold if self.side in ("both", "negative") else np.full(len(s), -np.inf)
+        return y, upper, lower, valid
+
+    def predict(self, s):
+        """Flags rows whose residual from the regression is anomalously large.
+
+        :param DataFrame s: Required. Validated multivariate series including the target column.
+
+        :returns: Series of booleans, NaN for rows with missing values.
+        """
+        y, upper, lower, valid = self._limits(s)
+        predicted = pd.Series((y > upper) | (y < lower), index=s.index).astype(object)
+        predicted[~valid] = np.nan
+        return predicted
+
+    def fit_detect(self, s):
+        """Fits on ``s`` and flags its anomalies.
+
+        :param DataFrame s: Required. Validated multivariate series including the target column.
+
+        :returns: Series of booleans, NaN for rows with missing values.
+        """
+        self.fit(s)
+        return self.predict(s)
+
+    def bounds(self, s, denominator):
+        """Calculates bounds in the same shape as ``ADTK_Bounds.ratio_bounds``, with the target as numerator. The expected target and the residual threshold are explicit, so the bounds are (expected ± threshold)/denominator and no stepping search is needed. Unlike ``ratio_bounds``, flagged points are not refit with the point replaced by the median ratio.
+
+        :param DataFrame s: Required. Validated multivariate series including the target column.
+
+        :param str denominator: Required. Denominator column of ``s``.
+
+        :returns: Pandas DataFrame with ratio bound violations.
+        """
+        y, upper, lower, valid = self._limits(s)
+        den = s[denominator].to_numpy(dtype=float)
+        out = pd.DataFrame(index=s.index)
+        out['Values'] = y/den
+        out['UCL'] = upper/den
+        out['LCL'] = lower/den
+        violation = ((y > upper) | (y < lower)).astype(float)
+        violation[~valid] = np.nan
+        out['Violation'] = violation
+        return out
+
+
+if __name__ == '__main__':
+    import adtk.detector as ad
+    from sklearn.linear_model import LinearRegression
+    rng = np.random.default_rng(0)
+    idx = pd.date_range("2021-01-01", periods=5000, freq="H")
+    den = rng.integers(100, 200, len(idx))
+    df = pd.DataFrame({"Numerator":rng.binomial(den, 0.1), "Denominator":den}, index=idx)
+    df.iloc[4500, 0] = 80
+    regression_ad = SufficientStatsRegressionAD("Numerator", c=3.0)
+    regression_ad.fit(df.iloc[:4000])
+    regression_ad.update(df)
+    print(regression_ad.predict(df).astype(float).sum(), ad.RegressionAD(LinearRegression(), target="Numerator", c=3.0).fit_detect(df).sum())
+    rolling_ad = SufficientStatsRegressionAD("Numerator", c=3.0, window=1000)
+    rolling_ad.fit(df.iloc[:4000])
+    rolling_ad.update(df)
+    print(rolling_ad.coef_, LinearRegression().fit(df[["Denominator"]].iloc[-1000:], df["Numerator"].iloc[-1000:]).coef_)
+    print(rolling_ad.bounds(df, "Denominator").iloc[4499:4501])
@@ -0,0 +1,98 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from .anomaly import Anomaly
+
+
+def walk_forward(df, recipe, start, step="1D", date_col="Date", var_type="univariate", numerator=None, denominator=None, weights=None, context=100):
+    """Replays history as it would have been scored step by step. Detectors in ``recipe`` are fit on the rows before ``start``. After that, every step of length ``step`` scores only its own new rows, with the history up to the end of the step as context.
+
+    Unlike calling new_obs on growing frames, the history is validated once, fitted state (rolling windows, sketches, incremental fits) carries over from step to step, and earlier rows are never bounded again. As in Anomaly.score_latest(), adtk detectors only see the last ``context`` rows before the step (at least one seasonal period) and search the step's bounds without refitting, so the cost of a step does not grow with the history and the whole replay is linear in its length. The result is therefore an approximation of what new_obs would have given: unflagged rows and rolling or incremental detectors match it, but the bounds of rows an adtk detector flags can differ slightly, since new_obs refits the detector on the full history for each of them.
+
+    :param DataFrame df: Required. Full history in the shape the Anomaly class takes.
+
+    :param list recipe: Required. List of (method name, dict of keyword arguments) pairs, as for Anomaly.fit_all().
+
+    :param start: Required. First timestamp to score. Everything before it is the baseline.
+
+    :param str step: Default "1D". Replay step as a pandas frequency string.
+
+    :param str date_col: Default "Date". Name of the date column of df.
+
+    :param str var_type: Default "univariate". "univariate" or "ratio".
+
+    :param str numerator: Default None. Numerator column for ratio metrics.
+
+    :param str denominator: Default None. Denominator column for ratio metrics.
+
+    :param list weights: Default None. Passed to Anomaly.assemble(). Equal weights if None.
+
+    :param int context: Default 100. Trailing rows of history given to adtk detectors at each step.
+
+    :returns: DataFrame in the shape of Anomaly.assemble(), covering the rows from start on.
+    """
+    history = Anomaly(df, var_type=var_type, numerator=numerator, denominator=denominator)
+    history.validate(date_col)
+    start = pd.Timestamp(start)
+    index = history.s.index
+    anomaly = Anomaly(history.df[history.df.index < start], var_type=var_type, numerator=numerator, denominator=denominator)
+    anomaly.validate(date_col)
+    anomaly.fit_all(recipe)
+    parts = [[] for i in anomaly.method]
+    n = max([context] + [getattr(proc, 'freq_', None) or 0 for proc in anomaly.proc])
+    for lo in pd.date_range(start, index[-1], freq=step):
+        first = index.searchsorted(lo)
+        hi = index.searchsorted(lo + pd.tseries.frequencies.to_offset(step))
+        new = index[first:hi]
+        if len(new) == 0:
+            continue
+        anomaly.s = history.s.iloc[max(first - n, 0):hi] #Views of the validated history, nothing is copied per step
+        anomaly.df = history.df.iloc[max(first - n, 0):hi]
+        for j in range(len(anomaly.method)):
+            bounds = anomaly._obs_bounds(anomaly.method[j], anomaly.proc[j], index=new, refit=False)
+            if bounds is not None:
+                parts[j].append(bounds)
+    anomaly.bounds = [anomaly._keep(pd.concat(p)) for p in parts if p]
+    return anomaly.assemble(weights)
+
+def _walk_forward_task(item):
+    name, df, kwargs = item
+    return name, walk_forward(df, **kwargs)
+
+def walk_forward_many(frames, recipe, start, n_jobs=None, **kwargs):
+    """Runs walk_forward for several metrics, in parallel processes if n_jobs is given.
+
+    :param dict frames: Required. Metric name to its full history DataFrame.
+
+    :param list recipe: Required. Passed to walk_forward().
+
+    :param start: Required. Passed to walk_forward().
+
+    :param int n_jobs: Default None. Number of worker processes. If None, metrics are replayed one after another.
+
+    :param kwargs: Passed on to walk_forward().
+
+    :returns: dict of metric name to replayed output.
+    """
+    kwargs = dict(kwargs, recipe=recipe, start=start)
+    items = [(name, df, kwargs) for name, df in frames.items()]
+    if n_jobs is None:
+        return dict(_walk_forward_task(item) for item in items)
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        return dict(pool.map(_walk_forward_task, items))
+
+
+if __name__ == '__main__':
+    import time
+    import numpy as np
+    rng = np.random.default_rng(0)
+    idx = pd.date_range("2021-01-01", periods=24*60, freq="H")
+    den = rng.integers(100, 200, len(idx))
+    num = rng.binomial(den, 0.1)
+    num[24*50] = 80
+    df = pd.DataFrame({"Date":idx, "Numerator":num, "Denominator":den})
+    recipe = [("spc", {"chart":"p"}), ("ad_quantile", {"window":24*7})]
+    begin = time.time()
+    out = walk_forward(df, recipe, "2021-02-01", date_col="Date", var_type="ratio", numerator="Numerator", denominator="Denominator", weights=[0.5, 0.5])
+    print(time.time() - begin, len(out), out[out.Violation > 0])
@@ -0,0 +1,192 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+
+class KLLSketch:
+
+    """Mergeable quantile sketch following Karnin, Lang & Liberty (2016), "Optimal Quantile Approximation in Streams".
+
+    Values are kept in a stack of compactors. Level h holds items of weight 2^h; when the sketch is full, a level is sorted and every other item (random offset) is promoted to the level above. Level capacities shrink geometrically by ``c`` going down the stack, so memory is O(k) no matter how many values are seen.
+
+    Accuracy: every compaction at level h shifts the rank of any query by at most 2^h, in a random direction. With the default k=200 and c=2/3 the normalized rank error is about 1.65% with 99% confidence, and it shrinks roughly as 1/k. A quantile estimate for q therefore sits between the true (q - eps) and (q + eps) quantiles of the stream, eps being that rank error.
+    """
+
+    def __init__(self, k=200, c=2/3, seed=None):
+        self.k = k
+        self.c = c
+        self.n = 0 #Number of values seen
+        self._rng = np.random.default_rng(seed)
+        self._levels = [np.empty(0)]
+
+    def _capacity(self, h):
+        depth = len(self._levels) - h - 1
+        return int(math.ceil(self.k*self.c**depth)) + 1
+
+    def _size(self):
+        return sum(len(level) for level in self._levels)
+
+    def _max_size(self):
+        return sum(self._capacity(h) for h in range(len(self._levels)))
+
+    def _compress(self):
+        while self._size() >= self._max_size():
+            for h in range(len(self._levels)):
+                if len(self._levels[h]) >= self._capacity(h):
+                    if h+1 == len(self._levels):
+                        self._levels.append(np.empty(0))
+                    level = np.sort(self._levels[h])
+                    keep = len(level) % 2
+                    offset = self._rng.integers(2)
+                    promoted = level[offset:len(level)-keep:2]
+                    self._levels[h+1] = np.concatenate([self._levels[h+1], promoted])
+                    self._levels[h] = level[len(level)-keep:]
+                    break
+
+    def update(self, values):
+        """Adds values to the sketch. NaNs are ignored.
+
+        :param values: Required. A scalar, array or Series of values.
+
+        :returns: None.
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.n += len(values)
+        self._levels[0] = np.concatenate([self._levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        """Folds another sketch into this one, e.g. one built by a different worker on a different slice of the history.
+
+        :param KLLSketch other: Required. Sketch to merge in. It is left unchanged.
+
+        :returns: None.
+        """
+        while len(self._levels) < len(other._levels):
+            self._levels.append(np.empty(0))
+        for h in range(len(other._levels)):
+            self._levels[h] = np.concatenate([self._levels[h], other._levels[h]])
+        self.n += other.n
+        self._compress()
+
+    def quantile(self, q):
+        """Estimates a quantile of every value seen so far.
+
+        :param float q: Required. Must be float between 0 and 1.
+
+        :returns: float, NaN if the sketch is empty.
+        """
+        if self.n == 0:
+            return np.nan
+        if len(self._levels) == 1:
+            return np.quantile(self._levels[0], q) #Nothing compacted yet, so this is exact
+        values = np.concatenate(self._levels)
+        weights = np.concatenate([np.full(len(level), 2.0**h) for h, level in enumerate(self._levels)])
+        order = np.argsort(values, kind='mergesort')
+        cum = np.cumsum(weights[order])
+        i = np.searchsorted(cum, q*cum[-1], side='left')
+        return values[order][min(i, len(values)-1)]
+
+    def __len__(self):
+        return self._size()
+
+
+class StreamingQuantileAD:
+
+    """Quantile detector whose thresholds come from a KLLSketch instead of the full history, so memory stays constant however long the series is. See KLLSketch for the accuracy bound on the thresholds.
+    """
+
+    def __init__(self, high=0.99, low=0.01, k=200, seed=None):
+        self.high = high
+        self.low = low
+        self.sketch = KLLSketch(k=k, seed=seed)
+
+    def fit(self, s):
+        """Resets the sketch and feeds it ``s``.
+
+        :param s: Required. Series, array or iterable of chunks.
+
+        :returns: None.
+        """
+        self.sketch = KLLSketch(k=self.sketch.k, c=self.sketch.c, seed=self.sketch._rng)
+        self.update(s)
+
+    def update(self, s):
+        """Feeds more history into the sketch. Accepts a single Series or array, or an iterable of them for chunked reads.
+
+        :param s: Required. Series, array or iterable of chunks.
+
+        :returns: None.
+        """
+        if isinstance(s, (pd.Series, pd.DataFrame, np.ndarray)) or np.isscalar(s):
+            self.sketch.update(s)
+        else:
+            for chunk in s:
+                self.sketch.update(chunk)
+
+    def merge(self, other):
+        """Merges the sketch of another StreamingQuantileAD fitted on a different part of the history.
+
+        :param StreamingQuantileAD other: Required.
+
+        :returns: None.
+        """
+        self.sketch.merge(other.sketch)
+
+    def thresholds(self):
+        """Current upper and lower thresholds.
+
+        :returns: tuple of (UCL, LCL).
+        """
+        upper = np.inf if self.high is None else self.sketch.quantile(self.high)
+        lower = -np.inf if self.low is None else self.sketch.quantile(self.low)
+        return upper, lower
+
+    def predict(self, s):
+        """Flags values outside the current thresholds.
+
+        :param Series s: Required. Validated univariate series.
+
+        :returns: Series of booleans, NaN where ``s`` is NaN.
+        """
+        upper, lower = self.thresholds()
+        predicted = (s > upper) | (s < lower)
+        predicted = predicted.astype(object)
+        predicted[s.isna()] = np.nan
+        return predicted
+
+    def bounds(self, s):
+        """Calculates bounds in the same shape as ``ADTK_Bounds.univ_bounds``.
+
+        :param Series s: Required. Validated univariate series.
+
+        :returns: Pandas DataFrame with univariate bound violations.
+        """
+        upper, lower = self.thresholds()
+        values = s.to_numpy(dtype=float)
+        out = pd.DataFrame(index=s.index)
+        out['Values'] = values
+        out['UCL'] = upper
+        out['LCL'] = lower
+        violation = ((values > upper) | (values < lower)).astype(float)
+        violation[np.isnan(values)] = np.nan
+        out['Violation'] = violation
+        return out
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    workers = [StreamingQuantileAD(high=0.99, low=0.01, seed=i) for i in range(4)]
+    history = []
+    for i, worker in enumerate(workers):
+        chunks = [rng.normal(size=100000) for j in range(5)]
+        history += chunks
+        worker.update(chunks)
+    for worker in workers[1:]:
+        workers[0].merge(worker)
+    history = np.concatenate(history)
+    print(workers[0].thresholds(), np.quantile(history, [0.99, 0.01]), len(workers[0].sketch))
@@ -5,6 +5,91 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import statistics
 
+from . import instrument
+from . import bootstrap as bs
+from . import changepoint
+from .utils_ad import nan_equal
+
+class LimitTable:
+    """p-chart limits of one pbar per distinct denominator. Limits are computed once per denominator in a vectorized pass and gathered by position afterwards, so scoring a row is a binary search and two comparisons. Denominators not seen yet are added on first use.
+    
+    ``to_dict`` and ``from_dict`` round-trip the table through plain lists, e.g. as JSON, so scorers without the baseline can flag points with ``flag`` alone.
+    """
+    def __init__(self, pbar, denominators=()):
+        self.pbar = float(pbar)
+        self.denominators = np.empty(0)
+        self.ucl = np.empty(0)
+        self.lcl = np.empty(0)
+        self.extend(denominators)
+        
+    def extend(self, denominators):
+        """Adds limits for denominators not in the table yet.
+        
+        :param denominators: Required. Array of denominators.
+        
+        :returns: None.
+        """
+        den = np.unique(np.asarray(denominators, dtype=float))
+        new = den[~np.isin(den, self.denominators)]
+        if np.isnan(self.denominators).any():
+            new = new[~np.isnan(new)] #isin never matches NaN, and the table already has its row
+        if len(new) == 0:
+            return
+        pse = np.sqrt((self.pbar*(1-self.pbar))/new)
+        den = np.concatenate([self.denominators, new])
+        order = np.argsort(den, kind='stable')
+        self.denominators = den[order]
+        self.ucl = np.concatenate([self.ucl, self.pbar+3*pse])[order]
+        self.lcl = np.concatenate([self.lcl, self.pbar-3*pse])[order]
+        
+    def lookup(self, denominators):
+        """Limits of each denominator.
+        
+        :param denominators: Required. Array of denominators.
+        
+        :returns: tuple of (UCL, LCL) arrays.
+        """
+        den = np.asarray(denominators, dtype=float)
+        pos = np.searchsorted(self.denominators, den)
+        if len(den) and ((pos == len(self.denominators)).any() or not nan_equal(np.take(self.denominators, pos, mode='clip'), den).all()):
+            self.extend(den)
+            pos = np.searchsorted(self.denominators, den)
+        return np.take(self.ucl, pos), np.take(self.lcl, pos)
+    
+    def flag(self, numerators, denominators):
+        """Flags points outside the limits.
+        
+        :param numerators: Required. Array of numerators.
+        
+        :param denominators: Required. Array of denominators.
+        
+        :returns: numpy array of 1 for violations and 0 otherwise.
+        """
+        values = np.asarray(numerators, dtype=float)/np.asarray(denominators, dtype=float)
+        ucl, lcl = self.lookup(denominators)
+        return ((values > ucl) | (values < lcl)).astype(int)
+    
+    def to_dict(self):
+        """Plain-list form of the table.
+        
+        :returns: dict with keys pbar, denominators, ucl and lcl.
+        """
+        return {'pbar':self.pbar, 'denominators':self.denominators.tolist(), 'ucl':self.ucl.tolist(), 'lcl':self.lcl.tolist()}
+    
+    @classmethod
+    def from_dict(cls, d):
+        """Rebuilds a table from to_dict() output without recomputing its limits.
+        
+        :param dict d: Required. Output of to_dict().
+        
+        :returns: LimitTable.
+        """
+        table = cls(d['pbar'])
+        table.denominators = np.asarray(d['denominators'], dtype=float)
+        table.ucl = np.asarray(d['ucl'], dtype=float)
+        table.lcl = np.asarray(d['lcl'], dtype=float)
+        return table
+
 class SPC:
     """"This class creates necessary functions for Statistical Process Control (SPC) charts. 
     
@@ -23,34 +108,50 @@ class SPC:
         self._n_df = None
         #p_chart specific params
         self._pbar = None
+        self._start = 0
+        self.baseline_start = None
+        self.table = None
         
-    def p_chart(self,numerator,denominator):
+    @instrument.timed('SPC.p_chart')
+    def p_chart(self,numerator,denominator,phase_one=False,penalty=None,min_size=5,table=None,min_length=20):
         """Runs the calculations necessary to create a p-chart on baseline data.
         
         :param str numerator: Required. The name of the numerator in the data frame fed into the class.
         
         :param str denominator: Required. The name of the denominator in the data frame fed into the class.
         
+        :param bool phase_one: Default False. If True, changepoints in the ratio are searched with changepoint.pelt() and pbar is taken over the most recent stable segment only. Limits and violations still cover every row, so earlier segments show up as violations. The row the segment starts at is kept in ``baseline_start``.
+        
+        :param float penalty: Default None. Passed to changepoint.pelt() when phase_one is True.
+        
+        :param int min_size: Default 5. Passed to changepoint.pelt() when phase_one is True.
+        
+        :param LimitTable table: Default None. Limit table shared between charts, used if its pbar equals this chart's and extended with this chart's denominators. A new table is built otherwise. The table in use is kept in ``table``.
+        
+        :param int min_length: Default 20. Passed to changepoint.stable_start() when phase_one is True.
+        
         :returns: DataFrame column specifying binary yes/no violations.
         """
         self._numerator = numerator
         self._denominator = denominator
         self._df['Values'] = self._df[numerator]/self._df[denominator]
-        self._pbar = statistics.mean(self._df['Values'])
-        pse = np.sqrt((self._pbar*(1-self._pbar))/(self._df[self._denominator]))
-        df = self._df.copy()
-        df['Violation'] = 0
-        for index in df['Values'].index:
-            ub = self._pbar+3*pse.at[index]
-            lb = self._pbar-3*pse.at[index]
-            if df.at[index,'Values'] > ub or df.at[index,'Values'] < lb:
-                df.at[index, "Violation"] = 1
-            else:
-                df.at[index,"Violation"] = 0
-        self._df['Violation'] = df['Violation']
+        start = 0
+        if phase_one:
+            start = changepoint.stable_start(self._df['Values'], self._df[denominator], penalty, min_size, min_length)
+        self._start = start
+        self.baseline_start = self._df.index[start]
+        self._pbar = statistics.mean(self._df['Values'].iloc[start:])
+        self.table = table if table is not None and table.pbar == self._pbar else LimitTable(self._pbar)
+        self._df['Violation'] = self._violations(self._df)
         self._chart = 'p_chart()'
-        return df['Violation']
+        return self._df['Violation'].copy()
+    
+    def _violations(self, df):
+        ucl, lcl = self.table.lookup(df[self._denominator])
+        values = df['Values'].to_numpy()
+        return pd.Series(((values > ucl) | (values < lcl)).astype(int), index=df.index)
     
+    @instrument.timed('SPC.predict')
     def predict(self,df):
         """Predicts anomalies depending on the baseline fit. 
         
@@ -62,17 +163,10 @@ class SPC:
         self._n_df = df
         if self._chart == 'p_chart()':
             df['Values'] = df[self._numerator]/df[self._denominator]
-            pse = np.sqrt((self._pbar*(1-self._pbar))/df[self._denominator])
-            df['Violation'] = 0
-            for index in df['Values'].index:
-                ub = self._pbar+3*pse.at[index]
-                lb = self._pbar-3*pse.at[index]
-                if df.at[index,'Values'] > ub or df.at[index,'Values'] < lb:
-                    df.at[index, "Violation"] = 1
-                else:
-                    df.at[index,"Violation"] = 0
+            df['Violation'] = self._violations(df)
         return df['Violation']
     
+    @instrument.timed('SPC.bounds')
     def bounds(self,predict=False):
         """Creates bound for chosen control chart. 
         
@@ -85,18 +179,56 @@ class SPC:
             * Violation
         """
         if predict:
-            df = self._n_df.copy()
+            df = self._n_df
         else:
-            df = self._df.copy()
+            df = self._df
         if self._chart == 'p_chart()':
-            # Plot p-chart
-            df['UCL'] = self._pbar+3*(np.sqrt((self._pbar*(1-self._pbar))/(df[self._denominator])))
-            df['LCL'] = self._pbar-3*(np.sqrt((self._pbar*(1-self._pbar))/(df[self._denominator])))
-            df = df[['Values','UCL','LCL','Violation']]
+            # Plot p-chart. Only the four output columns are built, the fitted frame is not copied
+            ucl, lcl = self.table.lookup(df[self._denominator])
+            df = pd.DataFrame({'Values':df['Values'], 'UCL':ucl, 'LCL':lcl, 'Violation':df['Violation']}, index=df.index)
             return df
         else:
             f = "no SPC chart was specified"
             return f
+
+    @instrument.timed('SPC.bootstrap')
+    def bootstrap(self, n_boot=1000, alpha=0.05, seed=None, n_jobs=None, chunk_cells=10**7):
+        """Bootstrap confidence intervals for pbar and the control limits of the baseline fit. Baseline rows (from ``baseline_start`` on) are resampled with replacement, pbar is recomputed for every resample at once, and the limits follow from each resampled pbar. Limits depend on a row only through its denominator, so they are evaluated once per distinct denominator.
+        
+        :param int n_boot: Default 1000. Number of resamples.
+        
+        :param float alpha: Default 0.05. 1 - confidence level.
+        
+        :param int seed: Default None. Seed for the resamples.
+        
+        :param int n_jobs: Default None. Number of threads resamples are spread over. See bootstrap.resample().
+        
+        :param int chunk_cells: Default 10**7. Largest number of matrix cells evaluated at once.
+        
+        :returns: DataFrame indexed like the baseline with the following columns:
+            * pbar, pbar_lower, pbar_upper
+            * UCL, UCL_lower, UCL_upper
+            * LCL, LCL_lower, LCL_upper
+        """
+        if self._chart != 'p_chart()':
+            f = "no SPC chart was specified"
+            return f
+        pbar = bs.resample(self._df['Values'].iloc[self._start:], lambda m: m.mean(axis=1), n_boot, seed, n_jobs, chunk_cells)
+        den, inverse = np.unique(self._df[self._denominator].to_numpy(dtype=float), return_inverse=True)
+        ucl = np.empty((2, len(den)))
+        lcl = np.empty((2, len(den)))
+        p = pbar[:, None]
+        step = max(1, chunk_cells//len(pbar))
+        for lo in range(0, len(den), step):
+            pse = np.sqrt(p*(1-p)/den[None, lo:lo+step])
+            ucl[:, lo:lo+step] = bs.interval(p+3*pse, alpha)
+            lcl[:, lo:lo+step] = bs.interval(p-3*pse, alpha)
+        pse = np.sqrt((self._pbar*(1-self._pbar))/den)
+        pbar_lower, pbar_upper = bs.interval(pbar, alpha)
+        df = pd.DataFrame({'pbar':self._pbar, 'pbar_lower':pbar_lower, 'pbar_upper':pbar_upper,
+                           'UCL':(self._pbar+3*pse)[inverse], 'UCL_lower':ucl[0][inverse], 'UCL_upper':ucl[1][inverse],
+                           'LCL':(self._pbar-3*pse)[inverse], 'LCL_lower':lcl[0][inverse], 'LCL_upper':lcl[1][inverse]}, index=self._df.index)
+        return df
         
 if __name__ == '__main__':
     num = [10,40,30,20,10,50,60,50,40,30,20,60,50,40,30,20,40]
@@ -112,5 +244,6 @@ if __name__ == '__main__':
     print(spc.predict(n_df))
     print(spc.bounds())
     print(spc.bounds(predict=True))
+    print(spc.bootstrap(seed=0))
     
     
\ No newline at end of file
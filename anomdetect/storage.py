@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+from .utils_ad import nan_equal
+
+def _smallest_int(n):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+def _encodings(values):
+    n = len(values)
+    yield 'dense', (values,)
+    change = np.ones(n, dtype=bool)
+    change[1:] = ~nan_equal(values[1:], values[:-1])
+    starts = np.flatnonzero(change)
+    yield 'rle', (starts.astype(_smallest_int(n)), values[starts])
+    uniques, codes, counts = np.unique(values, return_inverse=True, return_counts=True)
+    if len(uniques) <= np.iinfo(np.int16).max:
+        yield 'dict', (uniques, codes.astype(_smallest_int(len(uniques))))
+    fill = uniques[np.argmax(counts)]
+    positions = np.flatnonzero(~nan_equal(values, np.full(n, fill)))
+    yield 'sparse', (fill, positions.astype(_smallest_int(n)), values[positions])
+
+def _encode(values):
+    if not np.issubdtype(values.dtype, np.number) or len(values) == 0:
+        return 'dense', (values,)
+    values = values.astype(float)
+    best = None
+    for kind, parts in _encodings(values):
+        size = sum(np.asarray(part).nbytes for part in parts)
+        if best is None or size < best[0]:
+            best = (size, kind, parts)
+    return best[1], best[2]
+
+def _decode(kind, parts, n):
+    if kind == 'dense':
+        return parts[0]
+    elif kind == 'rle':
+        starts, run_values = parts
+        lengths = np.diff(np.append(starts.astype(np.int64), n))
+        return np.repeat(run_values, lengths)
+    elif kind == 'dict':
+        uniques, codes = parts
+        return uniques[codes]
+    else:
+        fill, positions, exceptions = parts
+        values = np.full(n, fill)
+        values[positions] = exceptions
+        return values
+
+
+class SparseBounds:
+
+    """Compressed form of a bounds DataFrame (Values, UCL, LCL, Violation). Each column is stored in whichever of four encodings is smallest:
+        * dense: the column as is;
+        * rle: run starts and run values, for piecewise constant bounds such as ad_quantile limits;
+        * dict: distinct values and small integer codes, for bounds that repeat without forming runs, such as p-chart limits of equal denominators;
+        * sparse: the most common value plus the positions and values of the rest, for rare violations.
+
+    A DatetimeIndex with a frequency is kept as start, frequency and length. ``to_frame`` decodes back to the original DataFrame, so a SparseBounds can stand in for a bounds frame wherever it is only stored, pickled or assembled.
+    """
+
+    def __init__(self, df):
+        self.n = len(df)
+        self.columns = list(df.columns)
+        self.dtypes = [df[col].dtype for col in self.columns]
+        index = df.index
+        if isinstance(index, pd.DatetimeIndex) and index.freq is not None and self.n > 0:
+            self._index = (index[0], index.freq, index.name)
+        else:
+            self._index = index
+        self._data = [_encode(df[col].to_numpy()) for col in self.columns]
+
+    @property
+    def index(self):
+        if isinstance(self._index, tuple):
+            start, freq, name = self._index
+            return pd.date_range(start, periods=self.n, freq=freq, name=name)
+        return self._index
+
+    def encodings(self):
+        """Encoding chosen for each column.
+
+        :returns: dict of column name to "dense", "rle", "dict" or "sparse".
+        """
+        return {col: kind for col, (kind, parts) in zip(self.columns, self._data)}
+
+    def violations(self):
+        """Timestamps flagged as violations, without decoding the other columns.
+
+        :returns: DatetimeIndex.
+        """
+        kind, parts = self._data[self.columns.index('Violation')]
+        if kind == 'sparse' and parts[0] != 1:
+            positions = parts[1][parts[2] == 1]
+        else:
+            positions = np.flatnonzero(_decode(kind, parts, self.n) == 1)
+        return self.index[positions]
+
+    def nbytes(self):
+        """Approximate memory held by the encoded columns.
+
+        :returns: int.
+        """
+        total = 0 if isinstance(self._index, tuple) else self._index.nbytes
+        for kind, parts in self._data:
+            total += sum(np.asarray(part).nbytes for part in parts)
+        return total
+
+    def to_frame(self):
+        """Decodes back to the dense bounds DataFrame.
+
+        :returns: Pandas DataFrame with the original columns, dtypes and index.
+        """
+        out = pd.DataFrame(index=self.index)
+        for col, dtype, (kind, parts) in zip(self.columns, self.dtypes, self._data):
+            out[col] = _decode(kind, parts, self.n).astype(dtype, copy=False)
+        return out
+
+    def __len__(self):
+        return self.n
+
+
+if __name__ == '__main__':
+    idx = pd.date_range("2019-01-01", periods=24*365*3, freq="H")
+    rng = np.random.default_rng(0)
+    den = rng.choice([100, 200, 400], len(idx))
+    values = rng.binomial(den, 0.1)/den
+    bounds = pd.DataFrame({"Values":values, "UCL":0.1+3*np.sqrt(0.09/den), "LCL":0.1-3*np.sqrt(0.09/den)}, index=idx)
+    bounds['Violation'] = ((bounds.Values > bounds.UCL) | (bounds.Values < bounds.LCL)).astype(float)
+    sparse = SparseBounds(bounds)
+    print(sparse.encodings(), sparse.nbytes(), bounds.memory_usage().sum(), len(sparse.violations()))
+    pd.testing.assert_frame_equal(sparse.to_frame(), bounds)
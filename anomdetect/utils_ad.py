@@ -1,22 +1,44 @@
+import numpy as np
 import pandas as pd
 
+from . import instrument
+
+def _logic_column(col):
+    if col.dtype == object:
+        if pd.api.types.infer_dtype(col, skipna=True) != 'boolean':
+            #Not purely True/False/NaN, fall back to the element-wise mapping
+            return col.map(lambda x: 1 if x==True else (0 if x==False else x))
+    elif not pd.api.types.is_bool_dtype(col.dtype):
+        return col
+    if col.hasnans:
+        return pd.Series(col.to_numpy(dtype='float64', na_value=np.nan), index=col.index, name=col.name)
+    return pd.Series(col.to_numpy(dtype='int64'), index=col.index, name=col.name)
+
+@instrument.timed('logic_to_numeric')
 def logic_to_numeric(data):
-    if isinstance(data, pd.DataFrame):
-        data = data.applymap(lambda x: 1 if x==True else (0 if x==False else x))
-    else:
-        data = data.to_frame()
-        data = data.applymap(lambda x: 1 if x==True else (0 if x==False else x))
-    return data
+    if not isinstance(data, pd.DataFrame):
+        return _logic_column(data).to_frame()
+    if len(data.columns) == 1:
+        return _logic_column(data.iloc[:, 0]).to_frame()
+    return pd.DataFrame({c: _logic_column(data[c]) for c in data.columns}, index=data.index)
 
 def num_den_to_ratio(s,numerator,denominator):
-    if isinstance(s, pd.DataFrame):
-        s['ratio'] = s[numerator] / s[denominator]
-    else:
+    if not isinstance(s, pd.DataFrame):
         s = s.to_frame()
-        s['ratio'] = s[numerator] / s[denominator]
-        
-    s = s['ratio']
-    return s
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = s[numerator].to_numpy(dtype='float64') / s[denominator].to_numpy(dtype='float64')
+    return pd.Series(ratio, index=s.index, name='ratio')
+
+def nan_equal(a, b):
+    #Element-wise ==, with NaN equal to NaN
+    return (a == b) | (np.isnan(a) & np.isnan(b))
+
+def weighted_sum(frames, weights):
+    #Column-wise weighted sum of bounds frames. A missing value drops out of its row and the weights of the frames that have one are rescaled to the same total, so a frame bounded on some rows only does not drag the others towards 0
+    total = pd.concat([df*w for df, w in zip(frames, weights)], axis=1).groupby(lambda x:x, axis=1).sum(min_count=1)
+    present = pd.concat([df.notna()*w for df, w in zip(frames, weights)], axis=1).groupby(lambda x:x, axis=1).sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return total*(sum(weights)/present)
 
 if __name__ == '__main__':
     pd.set_option("display.max_rows", None, "display.max_columns", None)
@@ -31,12 +53,7 @@ if __name__ == '__main__':
     print(sum([1/2,1/3,1/6]))
     
 def series_div(x,y):
-    j=0
-    for i in y:
-        if i == 0:
-            y[j] = 1
-            x[j] = 0
-        j+=1
-    return x / y
-    
-    
\ No newline at end of file
+    num = x.to_numpy(dtype='float64')
+    den = y.to_numpy(dtype='float64')
+    out = np.divide(num, den, out=np.zeros(len(num)), where=den != 0) #0 where the denominator is 0
+    return pd.Series(out, index=x.index)
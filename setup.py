@@ -15,4 +15,7 @@ setup(name='anomdetect',
             'statistics',
             'scikit-learn'
         ],
+      extras_require={
+            'parquet': ['pyarrow']
+        },
       zip_safe=False)